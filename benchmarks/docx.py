@@ -0,0 +1,61 @@
+"""Compare the native `.docx` extractor with pandoc on the cached corpus.
+
+Usage: python3 -m benchmarks.docx [<number>]
+
+Requires a running MongoDB server with a populated cache and pandoc.
+The Chapter 2 items extracted from either AST are compared for every
+document.
+"""
+
+import sys
+import time
+
+import magic
+
+from scrapers.client import _cache
+from scrapers.tasks.plenary_sittings import extract_pandoc_cap2, \
+                                           read_pandoc_transcript
+from scrapers.text_utils import docx_to_json, docx_to_json_native
+
+
+DOCX = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+
+def _iter_docx(number):
+    files = (f for f in _cache().file.find()
+             if f.url.endswith('.docx') or f.url.endswith('.doc'))
+    count = 0
+    for file in files:
+        payload = file.read()
+        if magic.from_buffer(payload, mime=True) == DOCX:
+            yield file.url, payload
+            count += 1
+            if count == number:
+                return
+
+
+def _extract(func, url, payload):
+    text, table = read_pandoc_transcript(func(payload))
+    cap2 = extract_pandoc_cap2(url, table)
+    return cap2 and cap2[0]
+
+
+def main(number=None):
+    timings = dict.fromkeys((docx_to_json, docx_to_json_native), 0)
+    mismatches = total = 0
+    for url, payload in _iter_docx(number):
+        results = []
+        for func in timings:
+            start = time.perf_counter()
+            results.append(_extract(func, url, payload))
+            timings[func] += time.perf_counter() - start
+        if len(set(results)) > 1:
+            mismatches += 1
+            print(f'Chapter 2 mismatch in {url!r}: {results}')
+        total += 1
+    print(f'{total} documents, {mismatches} mismatches')
+    for func, timing in timings.items():
+        print(f'{func.__name__:20}{timing:10.3f}s')
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
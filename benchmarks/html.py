@@ -0,0 +1,57 @@
+"""Compare eager and lazy link resolution in `parse_html`.
+
+Usage: python3 -m benchmarks.html [<links>]
+
+The input imitates a listing page with a single `articleBox`, and
+surrounding navigation, images and scripts.
+"""
+
+import sys
+import timeit
+import tracemalloc
+
+from scrapers import selectors as sel
+from scrapers.text_utils import parse_html, resolve_link
+
+
+URL = 'http://www.parliament.cy/easyconsole.cfm/id/290'
+
+
+def _make_text(links):
+    nav = ''.join(f'<li><a href="/easyconsole.cfm/id/{i}">{i}</a>'
+                  f'<img src="/images/{i}.png"></li>' for i in range(links))
+    rows = ''.join(f'<tr><td><a class="h3Style" href="/agenda/{i}.pdf">{i}'
+                   '</a></td></tr>' for i in range(links//10))
+    return (f'<html><head><script src="/a.js"></script></head><body>'
+            f'<ul>{nav}</ul><div class="articleBox"><table>{rows}</table>'
+            '</div></body></html>')
+
+
+def _parse(text, **kwargs):
+    html = parse_html(URL, text, **kwargs)
+    return [resolve_link(URL, h, html.base_url) for h in sel.H3_LINKS(html)]
+
+
+def _measure(text, kwargs):
+    tracemalloc.start()
+    _parse(text, **kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    time = min(timeit.repeat(lambda: _parse(text, **kwargs),
+                             number=1, repeat=5))
+    return time, peak
+
+
+def main(links=10000):
+    text = _make_text(links)
+    modes = {'eager': {},
+             'lazy': {'links': 'lazy'},
+             'subtree': {'links': 'lazy', 'subtree': sel.ARTICLE}}
+    assert len({tuple(_parse(text, **k)) for k in modes.values()}) == 1
+    print(f'{"":10}{"time (s)":>12}{"peak (B)":>16}')
+    for name, kwargs in modes.items():
+        time, peak = _measure(text, kwargs)
+        print(f'{name:10}{time:12.4f}{peak:16}')
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,84 @@
+"""Compare what is extracted from transcripts rendered in-house and by pandoc.
+
+Usage: python3 -m benchmarks.pandoc_text [<number>]
+
+Requires a running MongoDB server with a populated cache and pandoc.
+Every `.docx` transcript is converted to a pandoc AST and parsed twice.
+Once it's rendered by `read_pandoc_transcript`, which also picks out its
+Chapter 2 table.  Once it's rendered by pandoc's `plain` writer, with the
+table located in the fully decoded AST, as transcripts used to be read.
+The heading, start time, attendees and Chapter 2 items of either are
+compared, and the mismatches are listed and counted by field.
+"""
+
+import json
+import sys
+import time
+
+from benchmarks.docx import _iter_docx
+from scrapers.tasks.plenary_sittings import _locate_cap2_table, \
+                                             extract_attendees, \
+                                             extract_pandoc_cap2, \
+                                             extract_start_time, \
+                                             index_transcript, \
+                                             read_pandoc_transcript
+from scrapers.text_utils import clean_spaces, docx_to_json, pandoc_json_to
+
+
+FIELDS = ('heading', 'date', 'attendees', 'cap2')
+
+
+def _read_plain(json_):
+    table = next(filter(_locate_cap2_table, json.loads(json_)['blocks']),
+                 None)
+    return pandoc_json_to(json_, 'plain'), table
+
+
+def _attempt(fn, *args):
+    # Failures are compared too, by their messages
+    try:
+        return fn(*args)
+    except Exception as e:
+        return repr(e)
+
+
+def _extract(url, text, table):
+    sections = index_transcript(text)
+    heading = clean_spaces(text[sections.heading], medial_newlines=True)
+    date = _attempt(extract_start_time, heading)
+    return dict(zip(FIELDS, (heading, date,
+                             _attempt(extract_attendees,
+                                      url, text, heading, date, sections),
+                             _attempt(extract_pandoc_cap2, url, table))))
+
+
+def main(number=None):
+    readers = {'read_pandoc_transcript': read_pandoc_transcript,
+               'pandoc': _read_plain}
+    timings = dict.fromkeys(readers, 0)
+    mismatches = dict.fromkeys(FIELDS, 0)
+    total = 0
+    for url, payload in _iter_docx(number):
+        json_ = docx_to_json(payload)
+        results = []
+        for name, read in readers.items():
+            start = time.perf_counter()
+            text, table = read(json_)
+            timings[name] += time.perf_counter() - start
+            results.append(_extract(url, text, table))
+        ours, theirs = results
+
+        for field in FIELDS:
+            if ours[field] != theirs[field]:
+                mismatches[field] += 1
+                print(f'{field} mismatch in {url!r}:'
+                      f' {ours[field]!r} != {theirs[field]!r}')
+        total += 1
+    print(f'{total} documents')
+    for field, count in mismatches.items():
+        print(f'{field:25}{count:10} mismatches')
+    for name, timing in timings.items():
+        print(f'{name:25}{timing:10.3f}s')
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
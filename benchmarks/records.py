@@ -0,0 +1,130 @@
+"""Measure the cost of constructing records and preparing them for insertion.
+
+Usage: python3 -m benchmarks.records [<number>]
+
+The legacy construction, which deep-copied the template or `_raw_data`
+of every record and the data of every record being inserted, is
+reproduced here for comparison.  Each step is timed and its allocations
+traced.
+"""
+
+from copy import deepcopy
+import sys
+import timeit
+import tracemalloc
+
+from scrapers.records import BaseRecord, SubRecord, _compact, _sort, \
+                             _unwrap
+
+
+class _LegacyBaseRecord:
+
+    def __init__(self, *, _raw_data={}, **kwargs):
+        if _raw_data:
+            self.data = deepcopy(_raw_data)
+            return
+        self.data = deepcopy(self.template)
+        self.data.update(kwargs)
+
+    def __init_subclass__(cls):
+        cls.template = _sort(cls.template)
+
+
+def _legacy_compact(self):
+    return self.__class__(_raw_data={k: v for k, v in self.data.items() if v})
+
+
+def _legacy_unwrap(self):
+    def rekey(value, pk=''):
+        if isinstance(value, dict):
+            for k in value:
+                yield from rekey(value[k], '.'.join((pk, k)) if pk else k)
+        else:
+            yield pk, value
+
+    return self.__class__(_raw_data=self.data.__class__(rekey(self.data)))
+
+
+class _LegacySubRecord:
+
+    def __new__(cls, *, _raw_data={}, **kwargs):
+        return _sort(cls._construct(_raw_data=_raw_data, **kwargs).data)
+
+    def __init_subclass__(cls):
+        cls._construct = type(cls.__name__, (_LegacyBaseRecord,),
+                              dict(cls.__dict__))
+
+
+SITTING = {'_sources': [],
+           'agenda': {},
+           'attendees': [],
+           'links': [],
+           'parliamentary_period_id': None,
+           'session': None,
+           'sitting': None,
+           'start_date': None,
+           '_id': None}
+LINK = {'url': None, 'type': None}
+SUBMISSION = {'action': 'submission',
+              'plenary_sitting_id': None,
+              'committees_referred_to': None,
+              'sponsors': None,
+              'title': None}
+
+
+def _make(base, sub):
+    return (type('PlenarySitting', (base,), {'template': SITTING}),
+            type('Link', (sub,), {'template': LINK}),
+            type('Submission', (sub,), {'template': SUBMISSION}))
+
+
+def _build(records, number):
+    sitting, link, submission = records
+    return [sitting(_sources=[f'http://example.com/{i}'],
+                    agenda={'cap2': [submission(plenary_sitting_id=str(i),
+                                                title='Ο περί Φόρων Νόμος')
+                                     for _ in range(10)]},
+                    attendees=[{'mp_id': str(j)} for j in range(50)],
+                    links=[link(type='transcript',
+                                url=f'http://example.com/{i}')],
+                    start_date='2016-01-01')
+            for i in range(number)]
+
+
+def _prepare(built, compact, unwrap, copy):
+    # What `InsertableRecord.insert` does for merges and for new records
+    return ([compact(unwrap(r)).data for r in built],
+            [copy(r.data) for r in built])
+
+
+_VARIANTS = {
+    'legacy': (_make(_LegacyBaseRecord, _LegacySubRecord),
+               _legacy_compact, _legacy_unwrap, deepcopy),
+    'current': (_make(BaseRecord, SubRecord), _compact, _unwrap, dict)}
+
+
+def _measure(fn):
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(timeit.repeat(fn, number=1, repeat=5)), peak
+
+
+def main(number=2000):
+    built = {}
+    for name, (records, compact, unwrap, copy) in _VARIANTS.items():
+        built[name] = _build(records, number)
+        assert _prepare(built[name], compact, unwrap, copy) == \
+            _prepare(built['legacy'], *_VARIANTS['legacy'][1:])
+    print(f'{"":20}{"time (s)":>12}{"peak (B)":>16}')
+    for name, (records, compact, unwrap, copy) in _VARIANTS.items():
+        for step, fn in (
+                ('build', lambda: _build(records, number)),
+                ('prepare', lambda: _prepare(built[name],
+                                             compact, unwrap, copy))):
+            time, peak = _measure(fn)
+            print(f'{name + " " + step:20}{time:12.4f}{peak:16}')
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
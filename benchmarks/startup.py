@@ -0,0 +1,36 @@
+"""Time how long it takes the command-line interface to run a command.
+
+Usage: python3 -m benchmarks.startup [<repeat>]
+
+`cache clear` requires a running MongoDB server.  `tasks run` is given
+a non-existent task, so that it exits after loading the task registry
+without touching the network.
+"""
+
+import statistics
+import subprocess
+import sys
+import time
+
+
+COMMANDS = (('-h',),
+            ('cache', 'clear'),
+            ('tasks', 'run', '-'))
+
+
+def _time(args):
+    start = time.perf_counter()
+    subprocess.run((sys.executable, '-m', 'scrapers', *args),
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main(repeat=10):
+    for args in COMMANDS:
+        timings = [_time(args) for _ in range(repeat)]
+        print(f'{" ".join(("scrapers",) + args):24}'
+              f' median {statistics.median(timings):.3f}s'
+              f'  min {min(timings):.3f}s')
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
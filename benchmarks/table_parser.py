@@ -0,0 +1,81 @@
+"""Measure the cost of parsing plain-text tables with `TableParser`.
+
+Usage: python3 -m benchmarks.table_parser [<pages>]
+
+The input imitates the attendance lists of `pdftotext -layout`
+transcripts.  The legacy column detection (merging a `Counter` per line)
+is reproduced here for comparison.
+"""
+
+from collections import Counter
+import functools as ft
+import itertools as it
+import random
+import string
+import sys
+import timeit
+
+from scrapers.text_utils import TableParser
+
+
+class _LegacyTableParser(TableParser):
+
+    def _calc_col_modes(self):
+        col_freq = ft.reduce(lambda c, v: c + Counter(self._find_cols(v)),
+                             self._lines, Counter())
+        if not col_freq:
+            return ()
+
+        if self._columns:
+            return tuple(sorted(i for i, _ in
+                                col_freq.most_common(self._columns-1)))
+        else:
+            (_, most_common), = col_freq.most_common(1)
+            return tuple(sorted(k for k, v in col_freq.items()
+                                if v/most_common >= self._confidence))
+
+    @staticmethod
+    def _adjust_col(line, col):
+        part = line[:col]
+        if part == line:
+            return col
+
+        new_col = next(i for i, c in reversed(tuple(enumerate(part)))
+                       if c in string.whitespace)
+        return new_col
+
+
+def _name(rand):
+    return ' '.join(''.join(rand.choices('ΑΒΓΔΕΖΗΘΙΚΛΜΝΞΟΠΡΣΤΥΦΧΨΩ', k=1) +
+                            rand.choices('αβγδεζηθικλμνξοπρστυφχψω',
+                                         k=rand.randint(3, 12)))
+                    for _ in range(2))
+
+
+def _make_text(pages, seed=0):
+    rand = random.Random(seed)
+    lines = (''.join(f'{_name(rand)} ({rand.choice(("Λευκωσία", "Πάφος"))})'
+                     .ljust(44) for _ in range(rand.randint(1, 3)))
+             for _ in range(pages*60))
+    return '\n'.join(it.chain.from_iterable(
+        (l, '') if rand.random() < .1 else (l,) for l in lines))
+
+
+def _parse(cls, text, columns):
+    return cls(text, columns=columns).values
+
+
+def main(pages=50):
+    text = _make_text(pages)
+    print(f'{"":10}{"columns":>10}{"time (s)":>12}')
+    for columns in (None, 3):
+        assert (_parse(_LegacyTableParser, text, columns) ==
+                _parse(TableParser, text, columns))
+        for name, cls in (('legacy', _LegacyTableParser),
+                          ('current', TableParser)):
+            time = min(timeit.repeat(lambda: _parse(cls, text, columns),
+                                     number=1, repeat=5))
+            print(f'{name:10}{str(columns):>10}{time:12.4f}')
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
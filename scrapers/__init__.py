@@ -1,10 +1,87 @@
 
-from pymongo import MongoClient
+import os as _os
 
 from . import config
 
 
+_clients = {}
+
+
+def get_client(uri=config.DB):
+    """Return the `MongoClient` for the deployment at `uri`.
+
+    Clients are created on first use and are shared by all databases of a
+    deployment, e.g. the data and cache databases.  Pool size, timeouts and
+    write concern are read from `config`.
+    """
+    from pymongo import MongoClient, uri_parser
+
+    parsed = uri_parser.parse_uri(uri)
+    key = (tuple(parsed['nodelist']), parsed['username'], parsed['password'],
+           repr(sorted(parsed['options'].items())))
+    try:
+        return _clients[key]
+    except KeyError:
+        client = _clients[key] = MongoClient(
+            uri,
+            maxPoolSize=config.DB_POOL_SIZE,
+            connectTimeoutMS=config.DB_CONNECT_TIMEOUT_MS,
+            serverSelectionTimeoutMS=config.DB_SERVER_SELECTION_TIMEOUT_MS,
+            w=config.DB_WRITE_CONCERN)
+        return client
+
+
 def get_db(uri=config.DB):
-    return MongoClient(uri).get_default_database()
+    return get_client(uri).get_default_database()
+
+
+if hasattr(_os, 'register_at_fork'):
+    # Clients mustn't be shared with forked processes
+    _os.register_at_fork(after_in_child=_clients.clear)
+
+
+class _LazyCollection:
+    """A stand-in for a collection, which is resolved on first use.
+
+    The collection is resolved anew in forked processes, where the
+    parent's client may not be used.
+    """
+
+    def __init__(self, db, name):
+        self._db = db
+        self._name = name
+        self._collection = None
+        self._pid = None
+
+    def __getattr__(self, name):
+        if self._pid != _os.getpid():
+            self._collection = self._db[self._name]
+            self._pid = _os.getpid()
+        return getattr(self._collection, name)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__}: {self._name!r}>'
+
+
+class _LazyDatabase:
+    """A stand-in for a database, which is only connected to on first use.
+
+    Attributes which aren't attributes of `Database` are taken to be
+    collections, as with `Database` itself; these are resolved lazily,
+    so that models can be bound to collections at import time.
+    """
+
+    def __init__(self, uri):
+        self._uri = uri
+
+    def __getattr__(self, name):
+        from pymongo.database import Database
+
+        if name.startswith('_') or hasattr(Database, name):
+            return getattr(get_db(self._uri), name)
+        return _LazyCollection(self, name)
+
+    def __getitem__(self, name):
+        return get_db(self._uri)[name]
 
-default_db = get_db()
+default_db = _LazyDatabase(config.DB)
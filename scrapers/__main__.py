@@ -14,15 +14,20 @@ Options:
     -v --verbose    Print error messages of all levels
 """
 
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import itertools as it
 import json
 import logging
 from pathlib import Path
+import shlex
 import subprocess
 import textwrap
+import time
 
 from docopt import docopt, DocoptExit
 
-from . import client, default_db, io, models, records, tasks
+# The package's own modules are imported by the commands that use them,
+# so that e.g. `scrapers -h` doesn't have to pay for all of them
 
 
 def _git(cmd):
@@ -30,6 +35,14 @@ def _git(cmd):
                           check=True, shell=True, stdout=subprocess.PIPE)
 
 
+_LOAD_STATE = '_load_state'
+
+
+def _batched(iterable, size):
+    iterable = iter(iterable)
+    return iter(lambda: list(it.islice(iterable, size)), [])
+
+
 def _register(fn, name=None):
     if isinstance(fn, str):
         return lambda v: _register(v, name=fn)
@@ -47,10 +60,13 @@ def _exec_command(args, *, subcommand=None):
     except KeyError:
         raise DocoptExit('Unknown command')
     else:
+        # Options are only left alone for commands which hand their
+        # arguments on to a subcommand
+        dispatches = '<command> [<args> ...]' in command.__doc__
         args = docopt(command.__doc__,
                       argv=([i for i in [subcommand, args['<command>']] if i] +
                             args['<args>']),
-                      options_first=not subcommand)
+                      options_first=dispatches)
         command(args)
 
 
@@ -69,25 +85,100 @@ def manage_data(args):
     _exec_command(args, subcommand='data')
 
 
+def _parse_files(paths):
+    from . import io
+
+    with ProcessPoolExecutor() as executor:
+        yield from executor.map(io.YamlManager.load_record, paths,
+                                chunksize=32)
+
+
 @_register('data load')
 def load_data(args):
-    """Usage: scrapers data load [--keep-db] [<from-folders> ...]
+    """Usage: scrapers data load [--keep-db | --incremental]
+                                [--batch-size=<size>] [<from-folders> ...]
 
     Populate the database <from-folders>, defaulting to `./data/mps`.
+    Files are parsed in parallel and their documents are inserted in bulk.
+
+    The commit of the `data` repo that was loaded is recorded in the
+    database.  With `--incremental`, only files which have been added,
+    modified or removed since are loaded or deleted.
 
     Options:
-        -k --keep-db    Don't drop the database before importing
-        -h --help       Show this screen
+        -k --keep-db            Don't drop the database before importing
+        -i --incremental        Only load changes since the last load
+        --batch-size=<size>     Documents to insert at a time  [default: 1000]
+        -h --help               Show this screen
     """
+    from . import default_db
+
     assert _git('rev-parse --abbrev-ref HEAD').stdout.strip() == b'master'
+    head = _git('rev-parse HEAD').stdout.decode().strip()
+    folders = [Path(f) for f in args['<from-folders>'] or ('./data/mps',)]
+    if args['--incremental']:
+        state = default_db[_LOAD_STATE].find_one('data load')
+        if state:
+            _load_changes(state['commit'], head, folders,
+                          int(args['--batch-size']))
+            default_db[_LOAD_STATE].replace_one({'_id': 'data load'},
+                                                {'commit': head})
+            return
+        print('No previous load found; loading everything')
     if not args['--keep-db']:
         default_db.command('dropDatabase')
 
-    files = ((f, d.stem)
-             for d in map(Path, args['<from-folders>'] or ('./data/mps',))
-             for f in d.glob('*.yaml'))
-    for path, collection in files:
-        default_db[collection].insert_one(io.YamlManager.load_record(path))
+    start = time.perf_counter()
+    files = [(f, d.stem) for d in folders for f in d.glob('*.yaml')]
+    total = 0
+    docs = zip((c for _, c in files), _parse_files(f for f, _ in files))
+    for collection, group in it.groupby(docs, key=lambda i: i[0]):
+        for batch in _batched((d for _, d in group),
+                              int(args['--batch-size'])):
+            default_db[collection].insert_many(batch, ordered=False)
+            total += len(batch)
+    elapsed = time.perf_counter() - start
+    print(f'Loaded {total} documents from {len(files)} files'
+          f' in {elapsed:.2f}s ({total/elapsed:.0f} documents/s)')
+    default_db[_LOAD_STATE].replace_one({'_id': 'data load'}, {'commit': head},
+                                        upsert=True)
+
+
+def _load_changes(since, head, folders, batch_size):
+    import pymongo
+
+    from . import default_db
+
+    if since == head:
+        print(f'Already up to date with {head}')
+        return
+
+    root = Path('data').resolve()
+    try:
+        folders = {f.resolve().relative_to(root): f for f in folders}
+    except ValueError:
+        raise DocoptExit('Incremental loads are only possible from within'
+                         ' `./data`') from None
+    changes = _git(f'diff --name-status --no-renames -z {since} {head}')
+    changes = changes.stdout.decode().split('\0')
+    changes = [(s, Path(p)) for s, p in zip(changes[::2], changes[1::2])
+               if p.endswith('.yaml') and Path(p).parent in folders]
+    removed = [p for s, p in changes if s == 'D']
+    changed = [p for s, p in changes if s != 'D']
+
+    start = time.perf_counter()
+    ops = it.chain(
+        ((p.parent, pymongo.DeleteOne({'_id': p.stem})) for p in removed),
+        ((p.parent, pymongo.ReplaceOne({'_id': d['_id']}, d, upsert=True))
+         for p, d in zip(changed,
+                         _parse_files(folders[p.parent]/p.name
+                                      for p in changed))))
+    for folder, group in it.groupby(ops, key=lambda i: i[0]):
+        for batch in _batched((o for _, o in group), batch_size):
+            default_db[folder.name].bulk_write(batch, ordered=False)
+    elapsed = time.perf_counter() - start
+    print(f'Loaded {len(changed)} and removed {len(removed)} documents'
+          f' changed between {since} and {head} in {elapsed:.2f}s')
 
 
 @_register('data unload')
@@ -95,13 +186,19 @@ def unload_data(args):
     """Usage: scrapers data unload [--location=<location>] [<collections> ...]
 
     Dump <collections> at <location>.  The default behaviour is to dump all
-    collections.
+    collections.  Documents are serialised in parallel and only files whose
+    contents have changed are written to; files of documents which are no
+    longer in a collection are removed.
 
     Options:
         --location=<location>   Path on disk to dump the data  [default: ./data-new]
         -h --help               Show this screen
     """
-    for collection in (args['<collections>'] or default_db.collection_names()):
+    from . import default_db, io
+
+    for collection in (args['<collections>'] or
+                       [c for c in default_db.collection_names()
+                        if not c.startswith('_')]):
         collection = default_db[collection]
         if collection.count() == 0:
             raise DocoptExit(f'Collection {collection.full_name!r} is empty')
@@ -110,38 +207,104 @@ def unload_data(args):
         head = Path(args['--location'])/collection.name
         if not head.exists():
             head.mkdir(parents=True)
-        for document in collection.find():
-            io.YamlManager.dump_record(document, head)
+        with ProcessPoolExecutor() as executor:
+            results = dict(executor.map(io.YamlManager.dump_record,
+                                        collection.find(), it.repeat(head),
+                                        chunksize=64))
+        removed = set(head.glob('*.yaml')) - results.keys()
+        for path in removed:
+            path.unlink()
+        print(f'Wrote {sum(results.values())} files, left'
+              f' {len(results) - sum(results.values())} unchanged'
+              f' and removed {len(removed)}')
 
 
 @_register('data export')
 def export_data(args):
-    """Usage: scrapers data export [-p] [-s]
+    """Usage: scrapers data export [-p] [-s] [-z] [--force] [--format=<format>]
+                                  [--batch-size=<size>]
 
-    Export the database as a JSON data package.
+    Export the database as a JSON data package.  Collections are exported
+    in parallel and only those whose contents have changed since the last
+    export are rewritten.  Files left over from exporting in another
+    format, or with or without compression, are removed.
 
     Options:
-        -p --push           Push changes to remote repo
-        -s --stay           Stay on export branch
-        -h --help           Show this screen
+        -f --format=<format>    Export as `json`, `ndjson` or `csv`
+                                [default: json]
+        -z --gzip               Compress the exported files
+        --batch-size=<size>     Documents to fetch at a time  [default: 1000]
+        --force                 Export unchanged collections as well
+        -p --push               Push changes to remote repo
+        -s --stay               Stay on export branch
+        -h --help               Show this screen
     """
+    from . import io, models, records  # noqa
+
+    if args['--format'] not in io.ExportManager.WRITERS:
+        raise DocoptExit(f'Invalid format {args["--format"]!r}')
     assert _git('rev-parse --abbrev-ref HEAD').stdout.strip() == b'master'
     has_stash = _git('stash').stdout.strip() != b'No local changes to save'
     _git('checkout export')
 
-    for _, model in records.InsertableRecord.__records__:
-        print(f'Exporting {model.collection.name!r}...')
-        with Path('data', model.collection.name + '.json').open('w') as file:
-            file.write(model.export(format='json'))
-    with Path('data', 'datapackage.json').open('w') as file:
-        json.dump(records.InsertableRecord.__records__.create_data_package(),
-                  file, indent=2)
-
-    _git('add .')
-    _git('commit --author "export-script <export@script>"'
-         '       --message "Export data to JSON"')
-    if args['--push']:
-        _git('push')
+    package_path = Path('data', 'datapackage.json')
+    try:
+        with package_path.open() as file:
+            prior_resources = {r['name']: r
+                               for r in json.load(file)['resources']}
+    except FileNotFoundError:
+        prior_resources = {}
+
+    def export(model):
+        resource = model._as_resource(args['--format'], args['--gzip'])
+        path = Path('data', resource['path'])
+        source_hash = model.fingerprint()
+        prior_resource = prior_resources.get(resource['name'], {})
+        if (not args['--force'] and path.exists() and
+                prior_resource.get('source_hash') == source_hash and
+                all(prior_resource.get(k) == v for k, v in resource.items())):
+            print(f'Skipping unchanged {model.collection.name!r}')
+            return prior_resource, None
+
+        count = model.export(path, args['--format'], args['--gzip'],
+                             int(args['--batch-size']))
+        hash_, bytes_ = io.ExportManager.hash_file(path)
+        print(f'Exported {count} documents from {model.collection.name!r}')
+        return model._as_resource(args['--format'], args['--gzip'],
+                                  bytes=bytes_, count=count,
+                                  hash=f'sha256:{hash_}',
+                                  source_hash=source_hash), path
+
+    with ThreadPoolExecutor() as executor:
+        resources, paths = zip(*executor.map(
+            export,
+            (m for _, m in sorted(records.InsertableRecord.__records__))))
+    paths = [str(p.relative_to('data')) for p in paths if p]
+    stale_paths = {r['path'] for r in prior_resources.values()} - \
+        {r['path'] for r in resources}
+    for stale_path in stale_paths:
+        try:
+            Path('data', stale_path).unlink()
+        except FileNotFoundError:
+            pass
+        else:
+            print(f'Removed stale {stale_path!r}')
+    if paths or set(prior_resources) != {r['name'] for r in resources}:
+        with package_path.open('w') as file:
+            json.dump(records.InsertableRecord.__records__
+                      .create_data_package(list(resources)),
+                      file, indent=2)
+        if stale_paths:
+            _git('rm --cached --quiet --ignore-unmatch ' +
+                 ' '.join(map(shlex.quote, sorted(stale_paths))))
+        _git('add ' + ' '.join(map(shlex.quote,
+                                   paths + [package_path.name])))
+        _git('commit --author "export-script <export@script>"'
+             '       --message "Export data to JSON"')
+        if args['--push']:
+            _git('push')
+    else:
+        print('Nothing to export')
     if not args['--stay']:
         _git('checkout master')
         if has_stash:
@@ -150,17 +313,32 @@ def export_data(args):
 
 @_register('tasks')
 def run_task(args):
-    """Usage: scrapers tasks run [-d] <task>
+    """Usage: scrapers tasks run [-d] [--native-docx] [--incremental=<overlap>]
+                                 <task>
 
     Options:
-        -d --debug      Print `asyncio` debugging messages to `stderr`
-        -h --help       Show this screen
+        -d --debug                  Print `asyncio` debugging messages to
+                                    `stderr`
+        --native-docx               Extract `.docx` files without pandoc
+        --incremental=<overlap>     Page through listings newest first and
+                                    stop once more than <overlap> pages in
+                                    a row list only items seen before
+        -h --help                   Show this screen
     """
+    from . import client, tasks
+
     if args['<task>'] not in tasks.TASKS:
         raise DocoptExit('Available tasks are: ' +
                          '\n'.join(' ' * len('Available tasks are: ') + i
                                    for i in sorted(tasks.TASKS)).strip())
-    client.Client(debug=args['--debug'])(tasks.TASKS[args['<task>']])
+    overlap = args['--incremental']
+    if overlap is not None:
+        if not overlap.isdigit():
+            raise DocoptExit(f'Invalid overlap {overlap!r}')
+        overlap = int(overlap)
+    client.Client(debug=args['--debug'],
+                  native_docx=args['--native-docx'],
+                  overlap=overlap)(tasks.TASKS[args['<task>']])
 
 
 @_register('cache')
@@ -172,6 +350,8 @@ def manage_cache(args):
     Options:
         -h --help       Show this screen
     """
+    from . import client
+
     if args['clear']:
         client.Client.clear_text_cache()
     elif args['dump']:
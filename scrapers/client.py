@@ -1,30 +1,190 @@
 
 import asyncio
 import builtins
-from collections import namedtuple
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 import datetime as dt
-from functools import partial
+from functools import lru_cache, partial
+import hashlib
 import itertools as it
 import logging
+import os
+import pickle
+import subprocess
+import tempfile
+import time
 
 from aiohttp import ClientSession, TCPConnector, ClientResponseError
 import gridfs
 import magic
+from pymongo import ReplaceOne
 
-from . import config, get_db
-from .text_utils import doc_to_text, docx_to_json, parse_html, pdf_to_text
+from . import config, default_db, get_db, selectors
+from .text_utils import doc_to_text_args, docx_to_json_args, \
+                         docx_to_json_native, parse_html, \
+                         parse_pdf_page_count, pdf_page_count_args, \
+                         pdf_to_text_args
 
+logger = logging.getLogger(__name__)
 
-_CACHE = get_db(config.CACHE_DB)
-_CACHE = namedtuple('_CACHE', 'file text')(gridfs.GridFS(_CACHE),
-                                           _CACHE['text'])
+_Cache = namedtuple('_Cache', 'file text parsed')
+
+
+@lru_cache(maxsize=None)
+def _cache():
+    db = get_db(config.CACHE_DB)
+    return _Cache(gridfs.GridFS(db), db['text'], db['parsed'])
+
+
+if hasattr(os, 'register_at_fork'):
+    # The cache is bound to the parent's client
+    os.register_at_fork(after_in_child=_cache.cache_clear)
+
+
+class _DecoderMetrics:
+
+    __slots__ = ('jobs', 'failures', 'wait', 'run', 'bytes_in', 'bytes_out')
+
+    def __init__(self):
+        self.jobs = self.failures = self.bytes_in = self.bytes_out = 0
+        self.wait = self.run = 0.
+
+    def __str__(self):
+        if not self.jobs:
+            return '0 jobs'
+        return (f'{self.jobs} jobs ({self.failures} failed),'
+                f' {self.wait/self.jobs:.3f}s mean wait,'
+                f' {self.run/self.jobs:.3f}s mean run,'
+                f' {self.bytes_in/max(self.run, 1e-9)/1e6:.2f} MB/s in,'
+                f' {self.bytes_out/max(self.run, 1e-9)/1e6:.2f} MB/s out')
+
+
+class DecoderScheduler:
+    """Run decoders with a bounded number of processes between them.
+
+    Every decoder has got its own queue, which holds up submitters once
+    it's full, and its own workers, but the workers of all decoders share
+    a fixed number of slots - one per core, by default - so that a large
+    `gather` won't spawn more processes than there are cores to run them
+    on.  Latency and throughput are tallied up by decoder in `metrics`.
+    """
+
+    def __init__(self, workers=None, queue_size=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size or self.workers * 2
+        self.metrics = {}
+        self._queues = {}
+        self._tasks = []
+        self._slots = None
+
+    def _get_queue(self, decoder):
+        try:
+            return self._queues[decoder]
+        except KeyError:
+            if self._slots is None:
+                self._slots = asyncio.Semaphore(self.workers)
+            queue = self._queues[decoder] = asyncio.Queue(self.queue_size)
+            self.metrics[decoder] = _DecoderMetrics()
+            self._tasks.extend(
+                asyncio.ensure_future(self._work(decoder, queue))
+                for _ in range(self.workers))
+            return queue
+
+    async def _work(self, decoder, queue):
+        metrics = self.metrics[decoder]
+        while True:
+            job, size, submitted, future = await queue.get()
+            async with self._slots:
+                started = time.perf_counter()
+                try:
+                    output = await job()
+                except subprocess.CalledProcessError as e:
+                    # Whatever was output is passed on regardless, as it
+                    # was before exit statuses were checked
+                    logger.warning(f'{decoder} exited with {e.returncode}')
+                    metrics.failures += 1
+                    metrics.bytes_out += len(e.output)
+                    if not future.cancelled():
+                        future.set_result(e.output)
+                except Exception as e:
+                    metrics.failures += 1
+                    if not future.cancelled():
+                        future.set_exception(e)
+                else:
+                    metrics.bytes_out += len(output)
+                    if not future.cancelled():
+                        future.set_result(output)
+                finished = time.perf_counter()
+            metrics.jobs += 1
+            metrics.bytes_in += size
+            metrics.wait += started - submitted
+            metrics.run += finished - started
+            queue.task_done()
+
+    async def submit(self, decoder, job, size=0):
+        """Queue up the coroutine function `job` and await its result."""
+        future = asyncio.get_event_loop().create_future()
+        await self._get_queue(decoder).put((job, size, time.perf_counter(),
+                                            future))
+        return await future
+
+    async def run(self, decoder, args, input_=None):
+        """Run the command line `args`, returning its decoded `stdout`."""
+        return await self.submit(decoder, partial(self._get_output, args,
+                                                  input_),
+                                 len(input_ or b''))
+
+    async def run_with_file(self, decoder, build_args, buffer):
+        """Write `buffer` to a temporary file and run `build_args(path)`."""
+        async def job():
+            with tempfile.NamedTemporaryFile() as file:
+                file.write(buffer)
+                file.flush()
+                return await self._get_output(build_args(file.name))
+        return await self.submit(decoder, job, len(buffer))
+
+    @staticmethod
+    async def _get_output(args, input_=None):
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=(asyncio.subprocess.DEVNULL if input_ is None else
+                   asyncio.subprocess.PIPE),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL)
+        stdout, _ = await process.communicate(input_)
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, args,
+                                                stdout.decode())
+        return stdout.decode()
+
+    async def call(self, decoder, func, *args, size=0):
+        """Call `func` on the default executor."""
+        loop = asyncio.get_event_loop()
+        return await self.submit(
+            decoder, lambda: loop.run_in_executor(None, func, *args), size)
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks, self._queues, self._slots = [], {}, None
+
+    def log_metrics(self):
+        for decoder, metrics in sorted(self.metrics.items()):
+            logger.info(f'{decoder}: {metrics}')
 
 
 class Client:
 
     ClientResponseError = ClientResponseError
 
-    def __init__(self, debug=False):
+    def __init__(self, debug=False, native_docx=False, overlap=None):
+        self._native_docx = native_docx
+        # The number of pages of known items to page through in a listing
+        # before stopping, after the first; `None` to page through all of
+        # them
+        self.overlap = overlap
+        self.decoders = DecoderScheduler(config.DECODER_WORKERS)
         self._loop = asyncio.get_event_loop()
         self._loop.set_debug(enabled=debug)
 
@@ -35,18 +195,22 @@ class Client:
                            raise_for_status=True,
                            loop=self._loop) \
                 as self._session:
-            output = self._loop.run_until_complete(task(self)())
-        return task.after(output)
-
-    def exec_blocking(self, func):
-        return partial(self._loop.run_in_executor, None, func)
+            try:
+                output = self._loop.run_until_complete(task(self)())
+            finally:
+                self._loop.run_until_complete(self.decoders.close())
+                self.decoders.log_metrics()
+        try:
+            return task.after(output)
+        finally:
+            selectors.log_timings()
 
     async def gather(self, tasks):
         return await asyncio.gather(*tasks, loop=self._loop)
 
     async def get_text(self, url, *,
                         form_data=None, request_method='get', params=None):
-        exists = _CACHE.text.find_one(dict(url=url,
+        exists = _cache().text.find_one(dict(url=url,
                                            form_data=form_data,
                                            request_method=request_method))
         if exists:
@@ -56,45 +220,100 @@ class Client:
                                          data=form_data, params=params) \
                 as response:
             text = await response.text()
-        _CACHE.text.insert_one(dict(url=url,
+        _cache().text.insert_one(dict(url=url,
                                     form_data=form_data,
                                     request_method=request_method,
                                     text=text))
         return text
 
-    async def get_html(self, url, *, clean=False, **kwargs):
-        return parse_html(url, (await self.get_text(url, **kwargs)), clean)
+    async def get_html(self, url, *, clean=False, subtree=None, links='eager',
+                       **kwargs):
+        """Retrieve a page and parse it.  See `parse_html`."""
+        return parse_html(url, (await self.get_text(url, **kwargs)), clean,
+                          subtree, links)
+
+    async def get_payload(self, url, *, decode=False, params=None,
+                          pages=None):
+        """Retrieve a file and optionally convert it to text.
 
-    async def get_payload(self, url, *, decode=False, params=None):
+        `pages` is a `(first, last)` tuple of page numbers to limit the
+        conversion of PDFs to; `last` may be `None` for the last page.
+        It's ignored for all other formats.
+        """
         if decode is True:
-            return await self._decode_payload(url, await self.get_payload(url))
+            return await self._decode_payload(url, await self.get_payload(url),
+                                              pages or (1, None))
 
-        exists = _CACHE.file.find_one(dict(url=url))
+        exists = _cache().file.find_one(dict(url=url))
         if exists:
             return exists.read()
 
         async with self._session.get(url, params=params) as response:
             payload = await response.read()
-        _CACHE.file.put(payload, url=url)
+        _cache().file.put(payload, url=url)
         return payload
 
-    async def _decode_payload(self, url, payload):
-        DECODE_FUNCS = {'application/msword': doc_to_text,
-                        'application/pdf': pdf_to_text,
+    async def _decode_pdf(self, payload, first_page, last_page):
+        # Split the document up into chunks of pages that are converted
+        # in parallel.  `pdftotext` ends every page with a form feed, so
+        # the chunks can simply be joined back together
+        if last_page is None:
+            try:
+                last_page = parse_pdf_page_count(
+                    await self.decoders.run_with_file(
+                        'pdf_page_count', pdf_page_count_args, payload))
+            except ValueError:
+                return await self.decoders.run(
+                    'pdf_to_text', pdf_to_text_args(first_page), payload)
+        chunks = ((p, min(p + config.PDF_PAGES_PER_DECODE - 1, last_page))
+                  for p in range(first_page, last_page + 1,
+                                 config.PDF_PAGES_PER_DECODE))
+        return ''.join(await self.gather(
+            self.decoders.run('pdf_to_text', pdf_to_text_args(*c), payload)
+            for c in chunks))
+
+    async def _decode_doc(self, payload):
+        return await self.decoders.run('doc_to_text', doc_to_text_args(),
+                                       payload)
+
+    async def _decode_docx(self, payload):
+        if self._native_docx:
+            return await self.decoders.call('docx_to_json_native',
+                                            docx_to_json_native, payload,
+                                            size=len(payload))
+        return await self.decoders.run_with_file(
+            'docx_to_json', docx_to_json_args, payload)
+
+    async def _decode_payload(self, url, payload, pages):
+        DECODE_FUNCS = {'application/msword': ('doc_to_text',
+                                               self._decode_doc),
+                        'application/pdf': ('pdf_to_text',
+                                            partial(self._decode_pdf,
+                                                    first_page=pages[0],
+                                                    last_page=pages[1])),
                         'application/vnd.openxmlformats-officedocument.'
-                        'wordprocessingml.document': docx_to_json}
+                        'wordprocessingml.document':
+                            ('docx_to_json_native' if self._native_docx else
+                             'docx_to_json', self._decode_docx)}
 
         try:
-            decode_func = DECODE_FUNCS[magic.from_buffer(payload, mime=True)]
+            name, decode_func = \
+                DECODE_FUNCS[magic.from_buffer(payload, mime=True)]
         except KeyError:
             raise ValueError(f'Unable to decode {url!r}; unknown mime type')
         else:
-            return decode_func.__name__, \
-                await self.exec_blocking(decode_func)(payload)
+            return name, await decode_func(payload)
+
+    @staticmethod
+    def find_cached(urls):
+        """Those of `urls` which are in the cache."""
+        query = {'url': {'$in': list(urls)}}
+        return {*(d['url'] for d in _cache().text.find(query, {'url': True})),
+                *(f.url for f in _cache().file.find(query))}
 
     @classmethod
     def clear_text_cache(cls):
-        _CACHE.text.drop()
+        _cache().text.drop()
 
 
 def dump_cache(cache_path=None):
@@ -103,12 +322,12 @@ def dump_cache(cache_path=None):
 
     cache_dir = Path(cache_path or 'cache-dump')
     cache_dir.mkdir(exist_ok=True)
-    for file in _CACHE.file.find():
+    for file in _cache().file.find():
         path = Path(cache_dir, file.url.replace('://', '%3A%2F%2F'))
         path.parent.mkdir(exist_ok=True, parents=True)
         with path.open('wb') as file_handle:
             file_handle.write(file.read())
-    for file in _CACHE.text.find():
+    for file in _cache().text.find():
         url = urlparse(file['url'])._asdict()
         if file['form_data']:
             url['query'] = urlencode(file['form_data'])
@@ -120,6 +339,187 @@ def dump_cache(cache_path=None):
         file_handle.write(dt.datetime.now().isoformat())
 
 
+def parser_version(version):
+    """Declare the version of a parser, caching its results in `parse_all`.
+
+    The version must be bumped whenever the parser's output changes, which
+    discards the results of all previous versions.
+    """
+    def decorate(parse):
+        parse.parser_version = version
+        return parse
+    return decorate
+
+
+def _parse_serially_or_in_parallel(parse, items):
+    if config.PARSER_WORKERS <= 1 or len(items) <= 1:
+        return list(it.starmap(parse, items))
+
+    chunksize = max(1, len(items) // (config.PARSER_WORKERS * 4))
+    with ProcessPoolExecutor(config.PARSER_WORKERS) as executor:
+        return list(executor.map(parse, *zip(*items), chunksize=chunksize))
+
+
+def _parser_name(parse):
+    return f'{parse.__module__}.{parse.__qualname__}'
+
+
+def _hash_input(parse, item):
+    """Hash `item` together with the name and version of its parser."""
+    prefix = pickle.dumps((_parser_name(parse),
+                           getattr(parse, 'parser_version', None)))
+    return hashlib.sha256(prefix + pickle.dumps(item, protocol=4)).hexdigest()
+
+
+def _parse_cached(parse, items, batch_size=1000, max_size=15*1024**2):
+    name = _parser_name(parse)
+    version = parse.parser_version
+    cache = _cache().parsed
+    cache.delete_many({'parser': name, 'version': {'$ne': version}})
+
+    keys = [_hash_input(parse, i) for i in items]
+    results = {}
+    for i in range(0, len(keys), batch_size):
+        results.update((d['_id'], pickle.loads(d['result'])) for d in
+                       cache.find({'_id': {'$in': keys[i:i+batch_size]}}))
+
+    missing = {k: i for k, i in zip(keys, items) if k not in results}
+    new_results = _parse_serially_or_in_parallel(parse,
+                                                 list(missing.values()))
+    requests = []
+    for key, result in zip(missing, new_results):
+        results[key] = result
+        result = pickle.dumps(result, protocol=4)
+        if len(result) < max_size:
+            requests.append(ReplaceOne({'_id': key},
+                                       {'_id': key, 'parser': name,
+                                        'version': version,
+                                        'result': result},
+                                       upsert=True))
+    if requests:
+        cache.bulk_write(requests, ordered=False)
+    logger.info(f'{name}: {len(keys) - len(missing)} of {len(keys)}'
+                f' results read from cache')
+    return [results[k] for k in keys]
+
+
+class SourceLedger:
+    """A ledger of the source documents ingested by a task.
+
+    Every source is entered under its URL with a hash of its content (and
+    of the version of its parser) and the `_id`s of the records created
+    from it, so that unchanged sources can be skipped on subsequent runs.
+    The ledger is kept in the data database, which means that it's
+    discarded with the records when the database is reloaded.
+    """
+
+    def __init__(self, task, collection=None):
+        self.task = _camel_to_snake(task.__name__)
+        self.collection = (default_db['_sources'] if collection is None else
+                           collection)
+        self.counts = Counter(new=0, changed=0, unchanged=0)
+        self._pending = {}
+
+    def select(self, parse, items):
+        """Filter out the `items` whose sources haven't changed.
+
+        The URL of the source is the first element of each item.
+        """
+        items = list(items)
+        hashes = {d['url']: d['hash'] for d in
+                  self.collection.find({'task': self.task,
+                                        'url': {'$in': [i[0] for i in items]}},
+                                       {'url': True, 'hash': True})}
+        for item in items:
+            url, hash_ = item[0], _hash_input(parse, item)
+            if hashes.get(url) == hash_:
+                self.counts['unchanged'] += 1
+                continue
+            self.counts['changed' if url in hashes else 'new'] += 1
+            self._pending[url] = hash_
+            yield item
+
+    def record(self, url, record_ids):
+        """Enter a selected source along with the records it produced."""
+        self.collection.replace_one(
+            {'_id': f'{self.task} {url}'},
+            {'task': self.task, 'url': url, 'hash': self._pending.pop(url),
+             'records': sorted(set(filter(None, record_ids)))},
+            upsert=True)
+
+    @classmethod
+    def find_known(cls, urls, collection=None):
+        """Those of `urls` which are in the ledger of any task."""
+        collection = (default_db['_sources'] if collection is None else
+                      collection)
+        return {d['url'] for d in
+                collection.find({'url': {'$in': list(urls)}}, {'url': True})}
+
+    def report(self):
+        logger.info(f'{self.task}: {self.counts["new"]} new,'
+                    f' {self.counts["changed"]} changed and'
+                    f' {self.counts["unchanged"]} unchanged (skipped) sources')
+
+
+class Crawler:
+    """Visit every node reachable from a set of seeds once.
+
+    `visit` is a coroutine function which takes a node and returns a
+    tuple of the node's output and the nodes that it links to.  Nodes are
+    deduplicated on `key(node)` across the whole crawl and nodes further
+    than `max_depth` links away from the seeds aren't visited.  Nodes are
+    visited breadth first, one level at a time, and their outputs are
+    concatenated in that order.
+
+    >>> import asyncio
+    >>> graph = {'a': ['b', 'c'], 'b': ['c', 'd'], 'c': ['a', 'd'],
+    ...          'd': ['e'], 'e': []}
+    >>> async def visit(node):
+    ...     return [node], graph[node]
+    >>> class Client:
+    ...     async def gather(self, tasks):
+    ...         return await asyncio.gather(*tasks)
+    >>> def crawl(seeds, **kwargs):
+    ...     return asyncio.run(Crawler(Client(), visit, **kwargs)(seeds))
+    >>> crawl(['a', 'a'])
+    ['a', 'b', 'c', 'd', 'e']
+    >>> crawl(['a'], max_depth=1)
+    ['a', 'b', 'c']
+    >>> crawl(['a'], max_depth=0)
+    ['a']
+    >>> crawl(['b', 'B'], key=str.lower)
+    ['b', 'c', 'd', 'a', 'e']
+    """
+
+    def __init__(self, client, visit, *, key=None, max_depth=None):
+        self.c = client
+        self.visit = visit
+        self.key = key or (lambda node: node)
+        self.max_depth = max_depth
+        self.visited = set()
+
+    def _schedule(self, nodes):
+        for node in nodes:
+            key = self.key(node)
+            if key not in self.visited:
+                self.visited.add(key)
+                yield node
+
+    async def __call__(self, seeds):
+        output = []
+        level = list(self._schedule(seeds))
+        for depth in it.count():
+            results = await self.c.gather(self.visit(n) for n in level)
+            output.extend(it.chain.from_iterable(o for o, _ in results))
+            if depth == self.max_depth:
+                break
+            level = list(self._schedule(it.chain.from_iterable(
+                l for _, l in results)))
+            if not level:
+                break
+        return output
+
+
 def _camel_to_snake(s):
     name = ''.join(('_' if c is True else '') + ''.join(t)
                    for c, t in it.groupby(s, key=lambda i: i.isupper()))
@@ -142,5 +542,20 @@ class Task:
         for item in output:
             cls.parse_item(*item)
 
+    @staticmethod
+    def parse_all(parse, items):
+        """Call `parse(*item)` for every item in a pool of processes.
+
+        `parse` must be a module-level function and the items and their
+        results must be picklable.  Results are returned in order.  Items
+        are parsed serially if `config.PARSER_WORKERS` is 1.  The results
+        of parsers with a `parser_version` are cached, keyed on their
+        input.
+        """
+        items = list(items)
+        if hasattr(parse, 'parser_version'):
+            return _parse_cached(parse, items)
+        return _parse_serially_or_in_parallel(parse, items)
+
     def parse_item(*args):
         raise NotImplementedError
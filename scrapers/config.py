@@ -5,3 +5,26 @@ DB = _os.environ.get('OPENPATATA_SCRAPERS_DB',
                      'mongodb://localhost:27017/openpatata-data')
 CACHE_DB = _os.environ.get('OPENPATATA_SCRAPERS_CACHE_DB',
                            'mongodb://localhost:27017/openpatata-data-cache')
+DB_POOL_SIZE = int(_os.environ.get('OPENPATATA_SCRAPERS_DB_POOL_SIZE', 100))
+DB_CONNECT_TIMEOUT_MS = int(_os.environ.get(
+    'OPENPATATA_SCRAPERS_DB_CONNECT_TIMEOUT_MS', 20000))
+DB_SERVER_SELECTION_TIMEOUT_MS = int(_os.environ.get(
+    'OPENPATATA_SCRAPERS_DB_SERVER_SELECTION_TIMEOUT_MS', 30000))
+DB_WRITE_CONCERN = _os.environ.get('OPENPATATA_SCRAPERS_DB_WRITE_CONCERN', '1')
+DB_WRITE_CONCERN = (int(DB_WRITE_CONCERN) if DB_WRITE_CONCERN.isdigit() else
+                    DB_WRITE_CONCERN)
+YAML_CACHE = _os.environ.get(
+    'OPENPATATA_SCRAPERS_YAML_CACHE',
+    _os.path.join(_os.environ.get('XDG_CACHE_HOME',
+                                  _os.path.expanduser('~/.cache')),
+                  'openpatata-scrapers', 'yaml'))
+PANDOC_SERVERS = int(_os.environ.get('OPENPATATA_SCRAPERS_PANDOC_SERVERS',
+                                     _os.cpu_count() or 1))
+PANDOC_TIMEOUT = int(_os.environ.get('OPENPATATA_SCRAPERS_PANDOC_TIMEOUT',
+                                     120))
+PDF_PAGES_PER_DECODE = int(_os.environ.get(
+    'OPENPATATA_SCRAPERS_PDF_PAGES_PER_DECODE', 8))
+DECODER_WORKERS = int(_os.environ.get('OPENPATATA_SCRAPERS_DECODER_WORKERS',
+                                      _os.cpu_count() or 1))
+PARSER_WORKERS = int(_os.environ.get('OPENPATATA_SCRAPERS_PARSER_WORKERS',
+                                     _os.cpu_count() or 1))
@@ -2,11 +2,20 @@
 """Utilities for importing and exporting data files."""
 
 from collections import OrderedDict
+import csv
+import gzip
+import hashlib
+from io import TextIOWrapper
+import json
+import marshal
 import os
 from pathlib import Path
 
+from bson import json_util
 import yaml
 
+from . import config
+
 
 class DumpError(Exception):
     """Exception raised by `*Manager`s."""
@@ -29,24 +38,260 @@ class _YamlDumper(yaml.CSafeDumper, _YamlRepresenter):
     pass
 
 
+def _load_yaml(path):
+    with path.open() as file:
+        doc = yaml.load(file,
+                        Loader=yaml.CSafeLoader)
+        return doc
+
+
+def _replace_atomically(path, content):
+    temp_path = path.with_name(f'.{path.name}.tmp')
+    temp_path.write_bytes(content)
+    os.replace(temp_path, path)
+
+
 class YamlManager:
 
     @staticmethod
     def load_record(path: Path):
-        """Import a document from disk."""
-        with path.open() as file:
-            doc = yaml.load(file,
-                            Loader=yaml.CSafeLoader)
+        r"""Import a document from disk.
+
+        Parsed documents are cached in `config.YAML_CACHE` in marshal format,
+        keyed by the file's path, modification time and size.  Stale
+        entries are re-parsed and documents which can't be marshalled
+        (e.g. ones with dates in them) are never cached.  Set
+        `OPENPATATA_SCRAPERS_YAML_CACHE` to an empty string to disable
+        the cache.
+
+        >>> import tempfile
+        >>> from unittest.mock import patch
+        >>> temp_dir = Path(tempfile.mkdtemp())
+        >>> path = temp_dir/'a.yaml'
+        >>> _ = path.write_text('b: 1\n')
+        >>> cache = patch.object(config, 'YAML_CACHE', str(temp_dir/'cache'))
+        >>> _ = cache.start()
+
+        >>> YamlManager.load_record(path)
+        {'b': 1}
+        >>> with patch(__name__ + '._load_yaml', side_effect=AssertionError):
+        ...     YamlManager.load_record(path)
+        {'b': 1}
+
+        Files which have changed since are re-parsed.
+
+        >>> _ = path.write_text('b: 22\n')
+        >>> YamlManager.load_record(path)
+        {'b': 22}
+
+        Documents with dates in them are loaded but not cached.
+
+        >>> _ = path.write_text('b: 2016-01-01\n')
+        >>> YamlManager.load_record(path)
+        {'b': datetime.date(2016, 1, 1)}
+        >>> YamlManager.load_record(path)
+        {'b': datetime.date(2016, 1, 1)}
+        >>> cache_path, = (temp_dir/'cache').iterdir()
+        >>> marshal.loads(cache_path.read_bytes())[1]
+        {'b': 22}
+        >>> _ = cache.stop()
+        """
+        if not config.YAML_CACHE:
+            return _load_yaml(path)
+
+        stat = path.stat()
+        key = (marshal.version, str(path.resolve()),
+               stat.st_mtime_ns, stat.st_size)
+        cache_path = Path(config.YAML_CACHE,
+                          hashlib.sha1(key[1].encode()).hexdigest())
+        try:
+            cached_key, doc = marshal.loads(cache_path.read_bytes())
+            if cached_key == key:
+                return doc
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+
+        doc = _load_yaml(path)
+        try:
+            content = marshal.dumps((key, doc))
+        except ValueError:
             return doc
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            _replace_atomically(cache_path, content)
+        except OSError:
+            pass
+        return doc
 
     @staticmethod
     def dump_record(doc, head: Path):
-        """Save a database record on disk."""
+        """Save a database record on disk.
+
+        The record is only written out if it differs from the file on disk,
+        and is written to a temporary file first which then replaces the
+        original, so that a file is never left half-written.
+        `dump_record` returns the path to the file and whether it was
+        written to.
+
+        >>> import tempfile
+        >>> head = Path(tempfile.mkdtemp())
+        >>> YamlManager.dump_record({'_id': 'a', 'b': 'γ'}, head)[1]
+        True
+        >>> YamlManager.dump_record({'_id': 'a', 'b': 'γ'}, head)[1]
+        False
+        >>> YamlManager.dump_record({'_id': 'a', 'b': 'δ'}, head)[1]
+        True
+        >>> print((head/'a.yaml').read_text())
+        _id: a
+        b: δ
+        <BLANKLINE>
+        """
         try:
             doc_id = doc['_id']
         except KeyError:
             raise DumpError(f'No `_id` in {doc!r}') from None
-        with (head/f'{doc_id}.yaml').open('w') as file:
-            yaml.dump(doc, file,
-                      Dumper=_YamlDumper,
-                      allow_unicode=True, default_flow_style=False)
+        path = head/f'{doc_id}.yaml'
+        content = yaml.dump(doc,
+                            Dumper=_YamlDumper,
+                            allow_unicode=True, default_flow_style=False)
+        content = content.encode()
+        try:
+            if (path.stat().st_size == len(content) and
+                    hashlib.sha256(path.read_bytes()).digest() ==
+                    hashlib.sha256(content).digest()):
+                return path, False
+        except FileNotFoundError:
+            pass
+        _replace_atomically(path, content)
+        return path, True
+
+
+def _dump_json(doc):
+    return json.dumps(doc, ensure_ascii=False, default=json_util.default)
+
+
+class _JsonArrayWriter:
+
+    def __init__(self, file, fields):
+        self._file = file
+        self._separator = '[\n'
+
+    def write(self, doc):
+        self._file.write(self._separator)
+        self._file.write(_dump_json(doc))
+        self._separator = ',\n'
+
+    def close(self):
+        self._file.write('[]\n' if self._separator == '[\n' else '\n]\n')
+
+
+class _NdjsonWriter:
+
+    def __init__(self, file, fields):
+        self._file = file
+
+    def write(self, doc):
+        self._file.write(_dump_json(doc))
+        self._file.write('\n')
+
+    def close(self):
+        pass
+
+
+class _CsvWriter:
+
+    def __init__(self, file, fields):
+        self._writer = csv.DictWriter(file, fields, extrasaction='ignore')
+        self._writer.writeheader()
+
+    def write(self, doc):
+        self._writer.writerow({k: _dump_json(v) if isinstance(v, (dict, list))
+                               else v
+                               for k, v in doc.items()})
+
+    def close(self):
+        pass
+
+
+class ExportManager:
+
+    WRITERS = {'csv': _CsvWriter,
+               'json': _JsonArrayWriter,
+               'ndjson': _NdjsonWriter}
+
+    @classmethod
+    def dump_records(cls, docs, path: Path, format='json', fields=(),
+                     compress=False):
+        r"""Stream `docs` into a file at `path`.
+
+        Documents are written out as they're read from `docs`, which is
+        typically a database cursor.  gzip'ed files are written with a
+        fixed timestamp so that unchanged exports are byte-identical.
+        `dump_records` returns the number of documents written.
+
+        >>> import tempfile
+        >>> path = Path(tempfile.mkdtemp(), 'export')
+        >>> docs = [{'_id': 'a', 'b': {'c': 'δ'}}, {'_id': 'e', 'f': 1}]
+
+        >>> ExportManager.dump_records(docs, path)
+        2
+        >>> print(path.read_text())
+        [
+        {"_id": "a", "b": {"c": "δ"}},
+        {"_id": "e", "f": 1}
+        ]
+        <BLANKLINE>
+        >>> ExportManager.dump_records([], path)
+        0
+        >>> path.read_text()
+        '[]\n'
+        >>> ExportManager.dump_records(docs, path, 'ndjson')
+        2
+        >>> print(path.read_text())
+        {"_id": "a", "b": {"c": "δ"}}
+        {"_id": "e", "f": 1}
+        <BLANKLINE>
+        >>> ExportManager.dump_records(docs, path, 'csv', ('_id', 'b', 'f'))
+        2
+        >>> print(path.read_text())
+        _id,b,f
+        a,"{""c"": ""δ""}",
+        e,,1
+        <BLANKLINE>
+
+        Compressed exports decompress to the same content and don't
+        change from one export to the next.
+
+        >>> ExportManager.dump_records(docs, path, 'ndjson', compress=True)
+        2
+        >>> gzip.decompress(path.read_bytes()).decode()
+        '{"_id": "a", "b": {"c": "δ"}}\n{"_id": "e", "f": 1}\n'
+        >>> hash_, _ = ExportManager.hash_file(path)
+        >>> _ = ExportManager.dump_records(docs, path, 'ndjson', compress=True)
+        >>> ExportManager.hash_file(path)[0] == hash_
+        True
+        """
+        try:
+            writer = cls.WRITERS[format]
+        except KeyError:
+            raise ValueError(f'Invalid format {format!r}') from None
+        with path.open('wb') as file:
+            if compress:
+                file = gzip.GzipFile(filename='', mode='wb', fileobj=file,
+                                     mtime=0)
+            with TextIOWrapper(file, encoding='utf-8', newline='') as file:
+                writer = writer(file, fields)
+                count = 0
+                for count, doc in enumerate(docs, 1):
+                    writer.write(doc)
+                writer.close()
+        return count
+
+    @staticmethod
+    def hash_file(path: Path, chunk_size=2**16):
+        """Return the SHA-256 hash and size in bytes of the file at `path`."""
+        hash_ = hashlib.sha256()
+        with path.open('rb') as file:
+            for chunk in iter(lambda: file.read(chunk_size), b''):
+                hash_.update(chunk)
+        return hash_.hexdigest(), path.stat().st_size
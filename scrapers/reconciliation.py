@@ -1,4 +1,5 @@
 
+from collections.abc import Mapping
 import csv
 import itertools as it
 from pathlib import Path
@@ -38,6 +39,35 @@ Create record?  [y/N]
     return name, selection
 
 
+class _Pairings(Mapping):
+    """Name-to-ID pairings, read from disk on first access."""
+
+    def __init__(self, filename):
+        self._filename = filename
+        self._pairings = None
+
+    def _load(self):
+        if self._pairings is None:
+            with open(Path(__file__).parent/'data'/'reconciliation'
+                      /self._filename) as file:
+                self._pairings = dict(it.islice(csv.reader(file), 1, None))
+        return self._pairings
+
+    def __contains__(self, key):
+        return key in self._load()
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def get(self, key, default=None):
+        return self._load().get(key, default)
+
+
 def load_pairings(filename):
-    with open(Path(__file__).parent/'data'/'reconciliation'/filename) as file:
-        return dict(it.islice(csv.reader(file), 1, None))
+    return _Pairings(filename)
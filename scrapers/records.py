@@ -3,15 +3,15 @@
 
 from copy import deepcopy
 import datetime as dt
+import hashlib
 import itertools as it
 from pathlib import Path
 
-from jsonschema import Draft4Validator as Validator, FormatChecker
-from jsonschema.exceptions import ValidationError
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
 import pymongo
 
-from .io import YamlManager
-from .text_utils import _text_from_sp
+from .io import ExportManager, YamlManager
 
 
 class InsertError(Exception):
@@ -29,15 +29,29 @@ def _compact(self):
     ...  .data == {'a.b.c': 1})
     True
     """
-    return self.__class__(_raw_data={k: v for k, v in self.data.items() if v})
+    return _adopt(self.__class__, {k: v for k, v in self.data.items() if v})
+
+
+def _adopt(cls, data):
+    """Wrap `data` in a `cls` record without copying it.
+
+    Only to be used with dicts which have just been assembled and aren't
+    referenced anywhere else.
+
+    >>> data = {'a': [1]}
+    >>> _adopt(BaseRecord, data).data is data
+    True
+    """
+    self = cls.__new__(cls)
+    self.data = data
+    return self
 
 
 def _sort(data):
     """Traverse `data` to sort it and all sub-dicts alphabetically.
 
-    >>> _sort({'c': 1, 'a': 4, 'b': [{'β': 2, 'α': 3}]})  # doctest: +NORMALIZE_WHITESPACE
-    OrderedDict([('a', 4), ('b', [OrderedDict([('α', 3), ('β', 2)])]),
-                 ('c', 1)])
+    >>> _sort({'c': 1, 'a': 4, 'b': [{'β': 2, 'α': 3}]})
+    {'a': 4, 'b': [{'α': 3, 'β': 2}], 'c': 1}
     """
     def sort(value):
         if isinstance(value, dict):
@@ -64,14 +78,34 @@ def _unwrap(self):
         else:
             yield pk, value
 
-    return self.__class__(_raw_data=self.data.__class__(rekey(self.data)))
+    return _adopt(self.__class__, self.data.__class__(rekey(self.data)))
+
+
+def _find_mutable_keys(template):
+    return tuple(k for k, v in template.items()
+                 if isinstance(v, (dict, list)))
+
+
+class _LazyClassAttribute:
+    """A class attribute computed from the class on first access."""
+
+    def __init__(self, build):
+        self._build = build
+        self._name = build.__name__
+
+    def __get__(self, instance, owner):
+        value = self._build(owner)
+        setattr(owner, self._name, value)
+        return value
 
 
 class RecordRegistry(list):
 
-    def create_data_package(self):
+    def create_data_package(self, resources=None):
+        if resources is None:
+            resources = [m._as_resource() for _, m in sorted(self)]
         return _DataPackage(last_updated=dt.datetime.now().isoformat(),
-                            resources=[m._as_resource() for _, m in sorted(self)])
+                            resources=resources)
 
 
 class BaseRecord:
@@ -89,18 +123,31 @@ class BaseRecord:
     ...     required_properties = {'a', 'b'}
 
     >>> Base(a=1, b=2)
-    <Base: OrderedDict([('a', 1), ('b', 2), ('c', None)])>
+    <Base: {'a': 1, 'b': 2, 'c': None}>
+
+    Only the template's mutable defaults are copied, and only for those
+    properties which weren't provided.
+
+    >>> class Nested(BaseRecord):
+    ...     template = {'a': [], 'b': {}}
+    >>> Nested(b={'c': 1}).data['a'] is Nested.template['a']
+    False
     """
 
+    _mutable_keys = ()
+
     def __init__(self, *, _raw_data={}, **kwargs):
         if _raw_data:
             self.data = deepcopy(_raw_data)
             return
-        self.data = deepcopy(self.template)
-        self.data.update(kwargs)
+        self.data = {**self.template, **kwargs}
+        for key in self._mutable_keys:
+            if key not in kwargs:
+                self.data[key] = deepcopy(self.template[key])
 
     def __init_subclass__(cls):
         cls.template = _sort(getattr(cls, 'template', {}))
+        cls._mutable_keys = _find_mutable_keys(cls.template)
 
     def __repr__(self):
         return f'<{self.__class__.__name__}: {self.data!r}>'
@@ -190,13 +237,26 @@ class InsertableRecord(BaseRecord):
             self.data['_id'] = self.generate__id()
 
     def __init_subclass__(cls):
-        cls.schema = YamlManager.load_record(Path(__file__).parent/'data'
-                                             /'schemas'/f'{cls.schema}.yaml')
+        if isinstance(cls.__dict__.get('schema'), str):
+            # Defer loading the schema to `InsertableRecord.schema`
+            cls._schema_name = cls.schema
+            del cls.schema
         cls.template = {**cls.template, '_id': None}
-        cls.validator = Validator(cls.schema,
-                                  format_checker=FormatChecker(('email',)))
+        cls._mutable_keys = _find_mutable_keys(cls.template)
         cls.__records__.append((cls.__name__, cls))
 
+    @_LazyClassAttribute
+    def schema(cls):
+        """The record's JSON schema, loaded on first access."""
+        return YamlManager.load_record(Path(__file__).parent/'data'
+                                       /'schemas'/f'{cls._schema_name}.yaml')
+
+    @_LazyClassAttribute
+    def validator(cls):
+        from jsonschema import Draft4Validator, FormatChecker
+        return Draft4Validator(cls.schema,
+                               format_checker=FormatChecker(('email',)))
+
     @property
     def _id(self):
         """The record's primary key."""
@@ -245,7 +305,8 @@ class InsertableRecord(BaseRecord):
         prior_data = self.collection.find_one(self._id)
         if new:
             self.delete()
-            data = deepcopy(self.data)
+            # The generated inserts only ever pop top-level keys
+            data = dict(self.data)
         else:
             data = _compact(_unwrap(self)).data
 
@@ -285,27 +346,49 @@ class InsertableRecord(BaseRecord):
                                  **kwargs)
 
     @classmethod
-    def _as_resource(cls):
+    def _as_resource(cls, format='json', compress=False, **metadata):
+        path = f'{cls.collection.name}.{format}'
+        if compress:
+            return _DataPackage.Resource(name=cls.collection.name,
+                                         path=path + '.gz',
+                                         format=format,
+                                         compression='gzip',
+                                         **metadata)
         return _DataPackage.Resource(name=cls.collection.name,
-                                     path=cls.collection.name + '.json')
+                                     path=path,
+                                     format=format,
+                                     **metadata)
 
     @classmethod
-    def export(cls, format):
-        if format == 'json':
-            return _text_from_sp(
-                ('mongoexport', '--jsonArray',
-                                '--db=' + cls.collection.database.name,
-                                '--collection=' + cls.collection.name))
-        elif format == 'csv':
-            return _text_from_sp(
-                ('mongoexport', '--type=' + format,
-                                '--db=' + cls.collection.database.name,
-                                '--collection=' + cls.collection.name,
-                                '--fields=' + ','.join(sorted(cls.template))))
-        raise ValueError(f'Invalid format {format!r}')
+    def fingerprint(cls, batch_size=1000):
+        """Hash the contents of the collection, in `_id` order.
+
+        Documents are hashed as raw BSON, without being decoded, which makes
+        `fingerprint` a lot cheaper than an export.  Any change to the
+        collection, whether through a record or not, changes its fingerprint.
+        """
+        collection = cls.collection.with_options(
+            codec_options=CodecOptions(document_class=RawBSONDocument))
+        hash_ = hashlib.sha256()
+        for doc in collection.find(sort=[('_id', 1)], batch_size=batch_size):
+            hash_.update(doc.raw)
+        return hash_.hexdigest()
+
+    @classmethod
+    def export(cls, path, format='json', compress=False, batch_size=1000):
+        """Stream the collection into a file at `path`, in `_id` order.
+
+        Documents are fetched `batch_size` at a time, so memory use doesn't
+        grow with the size of the collection.  `export` returns the number
+        of documents exported.
+        """
+        return ExportManager.dump_records(
+            cls.collection.find(sort=[('_id', 1)], batch_size=batch_size),
+            path, format, fields=sorted(cls.template), compress=compress)
 
     @classmethod
     def validate(cls):
+        from jsonschema.exceptions import ValidationError
         for i in cls.collection.find():
             try:
                 cls.validator.validate(i)
@@ -318,20 +401,25 @@ class InsertableRecord(BaseRecord):
 class SubRecord:
     """A record contained within another record.
 
-    A SubRecord returns its `self.data` on initialisation.
+    A SubRecord returns its data, sorted, on initialisation.  Sub-dicts are
+    sorted as well, including those nested in lists.  SubRecords used to
+    return their data in template order, followed by any extra keys.
 
     >>> class Sub(SubRecord):
-    ...     template = {'a': None, 'b': None, 'c': None}
+    ...     template = {'c': None, 'b': None, 'a': None}
 
     >>> Sub(a=1, b=2)
-    OrderedDict([('a', 1), ('b', 2), ('c', None)])
+    {'a': 1, 'b': 2, 'c': None}
+    >>> Sub(a=1, d={'β': 2, 'α': 3})
+    {'a': 1, 'b': None, 'c': None, 'd': {'α': 3, 'β': 2}}
+    >>> Sub(e=[{'β': 2, 'α': 3}])
+    {'a': None, 'b': None, 'c': None, 'e': [{'α': 3, 'β': 2}]}
     """
 
     def __new__(cls, *, _raw_data={}, **kwargs):
-        return _sort(cls._construct(_raw_data=_raw_data, **kwargs)).data
-
-    def __init_subclass__(cls):
-        cls._construct = type(cls.__name__, (BaseRecord,), dict(cls.__dict__))
+        # Sorting rebuilds every dict and list, which copies the template's
+        # mutable defaults as well
+        return _sort(_raw_data or {**cls.template, **kwargs})
 
 
 class _DataPackage(SubRecord):
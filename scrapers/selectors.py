@@ -0,0 +1,127 @@
+
+"""Precompiled XPath selectors shared by the tasks.
+
+Values are passed to selectors as XPath variables rather than being
+interpolated into the expression, so that every expression is compiled
+once per process.  Each selector keeps a count of its calls and the time
+spent evaluating it.
+"""
+
+import functools as ft
+import logging
+import time
+
+import lxml.etree
+
+
+logger = logging.getLogger(__name__)
+
+_REGISTRY = {}
+
+
+class Selector:
+    """A compiled XPath expression.
+
+    >>> import lxml.html
+    >>> html = lxml.html.fromstring('<p><a href="a">1</a>'
+    ...                             '<a href="b">2"</a></p>')
+    >>> links = Selector('test_links', '//a[contains(., $text)]/@href')
+    >>> links(html, text='2"')
+    ['b']
+    >>> links.calls
+    1
+    >>> _REGISTRY.pop('test_links') is links
+    True
+    """
+
+    __slots__ = ('name', 'path', 'calls', 'elapsed', '_xpath')
+
+    def __init__(self, name, path):
+        if name in _REGISTRY:
+            raise ValueError(f'Selector {name!r} already exists')
+        self.name = name
+        self.path = path
+        self.calls = 0
+        self.elapsed = 0.
+        self._xpath = lxml.etree.XPath(path, smart_strings=False)
+        _REGISTRY[name] = self
+
+    def __call__(self, node, **variables):
+        start = time.perf_counter()
+        try:
+            return self._xpath(node, **variables)
+        finally:
+            self.calls += 1
+            self.elapsed += time.perf_counter() - start
+
+    def __repr__(self):
+        return f'<Selector {self.name}: {self.path!r}>'
+
+
+def log_timings():
+    """Log the selectors that were evaluated, the slowest first.
+
+    Selectors evaluated in worker processes are tallied in those processes
+    and are not included.
+    """
+    for selector in sorted((s for s in _REGISTRY.values() if s.calls),
+                           key=lambda s: s.elapsed, reverse=True):
+        logger.info(f'{selector.name}: {selector.calls} calls,'
+                    f' {selector.elapsed:.3f}s')
+
+
+# Listings
+
+LINKS = Selector('links', '//a/@href')
+H3_LINKS = Selector('h3_links', '//a[@class="h3Style"]/@href')
+PAGING_LINKS = Selector('paging_links',
+                        '//a[contains(@class, "pagingStyle")]/@href')
+LINKS_LABELLED = Selector('links_labelled',
+                          '//a[contains(string(.), $label)]/@href')
+DESCENDANT_LINKS = Selector('descendant_links', './/a/@href')
+
+# Articles
+
+HEADING_TEXT = Selector('heading_text', 'string(//h1)')
+ARTICLE = Selector('article', '//div[@class="articleBox"]')
+ARTICLE_TEXT = Selector('article_text', 'string(//div[@class="articleBox"])')
+ARTICLE_ROWS = Selector('article_rows', '//div[@class="articleBox"]//tr')
+ARTICLE_LEAD_TEXT = Selector('article_lead_text',
+                             'string(//div[@class="articleBox"]/p[1])')
+ARTICLE_TABLE_ROWS = Selector('article_table_rows',
+                              '//div[@class="articleBox"]'
+                              '/div[2]/table[1]//tr')
+STRING_VALUE = Selector('string_value', 'string()')
+
+# Questions
+
+QUESTION_BLOCKS = Selector('question_blocks', '//*[self::hr or self::p]')
+
+# MP profiles
+
+PARA_AFTER_LABEL = Selector('para_after_label',
+                            '//p[contains(strong/text(), $label)]'
+                            '/following-sibling::p[1]')
+LABELS = Selector('labels', './strong/text()')
+UNLABELLED_NODES = Selector('unlabelled_nodes', './node()[not(self::strong)]')
+IMAGE_LINKS = Selector('image_links',
+                       '//a[@class="lightview"]/@href |'
+                       ' //a[contains(@href, "/assets/image/imageoriginal")]'
+                       '/@href')
+
+
+@ft.lru_cache()
+def labelled_para_text(count):
+    """The text of paragraphs labelled with any of `count` labels.
+
+    The labels are bound to `$label0`, `$label1` and so on.
+
+    >>> labelled_para_text(2).path.split(' or ')
+    ...                 # doctest: +NORMALIZE_WHITESPACE
+    ['//p[contains(strong/text(), $label0)',
+     'contains(strong/text(), $label1)]/text()']
+    """
+    return Selector(f'labelled_para_text_{count}',
+                    '//p[{}]/text()'.format(' or '.join(
+                        f'contains(strong/text(), $label{i})'
+                        for i in range(count))))
@@ -0,0 +1,101 @@
+
+"""Crawling of the paginated listings on parliament.cy."""
+
+import functools as ft
+import logging
+
+from ..client import Crawler, SourceLedger
+from .. import selectors as sel
+from ..text_utils import resolve_link
+
+
+logger = logging.getLogger(__name__)
+
+
+def extract_page_numbers(html):
+    return [''.join(filter(str.isdigit, p)) for p in sel.PAGING_LINKS(html)]
+
+
+async def _visit_page(client, url, page):
+    form_data = None if page is None else {'page': page}
+    html = await client.get_html(url, links='lazy', form_data=form_data,
+                                 request_method='post')
+    return ([resolve_link(url, h, html.base_url) for h in sel.H3_LINKS(html)],
+            () if page is None else extract_page_numbers(html))
+
+
+def _page_order(page):
+    return int(page or 0)
+
+
+def _are_known(client, links, key):
+    """Whether all of `links` are in the cache or in a task's ledger.
+
+    The cache is searched for `key(link)` and the ledgers for `link`.
+    """
+    keys = {link: key(link) for link in links}
+    cached = client.find_cached(set(keys.values()))
+    uncached = {link for link, k in keys.items() if k not in cached}
+    return not uncached or not uncached - SourceLedger.find_known(uncached)
+
+
+async def _crawl_newest_first(client, url, pages, key):
+    """Visit pages in order until more than `client.overlap` pages in a
+    row have had nothing but known items on them.
+
+    Pages without any items count as having only known items on them.
+    A blank or `None` page number stands for the first page.
+
+    >>> import asyncio
+    >>> from unittest import mock
+    >>> listing = {'': ['a'], '2': ['b'], '3': ['c'], '4': ['d'], '5': [],
+    ...            '6': ['e'], None: ['f']}
+    >>> async def visit(client, url, page):
+    ...     return listing[page], ()
+    >>> class Client:
+    ...     overlap = 1
+    ...     def find_cached(self, urls):
+    ...         return urls & {'b/el', 'e/el', 'f/el'}
+    >>> def crawl(pages):
+    ...     with mock.patch(f'{__name__}._visit_page', visit), \\
+    ...             mock.patch.object(SourceLedger, 'find_known',
+    ...                               lambda urls: urls & {'d'}):
+    ...         return asyncio.run(_crawl_newest_first(
+    ...             Client(), 'url', pages, lambda url: f'{url}/el'))
+    >>> crawl(['6', '5', '4', '3', '2', ''])
+    ['a', 'b', 'c', 'd']
+    >>> crawl([None])
+    ['f']
+    """
+    links, pending, visited, overlap = [], set(pages), set(), 0
+    while pending and overlap <= client.overlap:
+        page = min(pending, key=_page_order)
+        visited.add(page)
+        page_links, more_pages = await _visit_page(client, url, page)
+        links.extend(page_links)
+        pending = (pending | set(more_pages)) - visited
+        overlap = overlap + 1 if _are_known(client, page_links, key) else 0
+    if pending:
+        logger.info(f'Stopped paging through {url!r} at page {page}')
+    return links
+
+
+async def crawl_paged_listing(client, url, key=lambda url: url):
+    """Collect the links to the items of a listing from all of its pages.
+
+    Pages are POSTed with their number.  Pages linked to from other
+    pages are visited in turn, and every page is visited once.  Listings
+    without pagination are POSTed once, without a page number.
+
+    If `client.overlap` is set, pages are visited newest (lowest-numbered)
+    first, one at a time, and paging stops early once the items have
+    been retrieved before: if the URL they're retrieved from, which `key`
+    maps their links to, is in the cache, or if their links are in the
+    ledger of a task (see `SourceLedger`).
+    """
+    html = await client.get_html(url, links='lazy')
+    pages = extract_page_numbers(html)
+    if pages and client.overlap is not None:
+        return await _crawl_newest_first(client, url, pages, key)
+    crawl = Crawler(client, ft.partial(_visit_page, client, url))
+    return await crawl(pages or [None])
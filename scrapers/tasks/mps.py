@@ -5,12 +5,14 @@ import itertools as it
 import json
 import logging
 
-from ..client import Task
+from ..client import SourceLedger, Task
 from ..models import (ContactDetails, Identifier, Link,
                       MP, MultilingualField, OtherName)
 from ..reconciliation import pair_name, load_pairings
-from ..text_utils import (clean_spaces, parse_long_date,
+from .. import selectors as sel
+from ..text_utils import (clean_spaces, parse_html, parse_long_date,
                           translit_elGrek2Latn, translit_el2tr)
+from .listings import crawl_paged_listing
 
 
 logger = logging.getLogger(__name__)
@@ -34,29 +36,26 @@ class MpProfiles(Task):
                                    for i in mp_urls for u, t in i)
 
     async def process_multi_page_listing(self, url):
-        html = await self.c.get_html(url)
-        pages = html.xpath('//a[contains(@class, "pagingStyle")]/@href')
-        if pages:
-            mps = await self.c.gather(self.process_multi_page_page(
-                url, form_data={'page': ''.join(c for c in p
-                                                if c.isdigit())}) for p in pages)
-            mps = it.chain.from_iterable(mps)
-        else:
-            mps = await self.process_multi_page_page(url)
+        mps = await crawl_paged_listing(self.c, url,
+                                        key=lambda u: f'{u}/lang/el')
         return zip(mps,
                    it.repeat({'182': '11', '186': '11', '2004': '10', '2033': '10'
                               }[url.rpartition('/')[-1]]))
 
-    async def process_multi_page_page(self, url, form_data=None):
-        html = await self.c.get_html(url,
-                                     form_data=form_data, request_method='post')
-        return html.xpath('//a[@class="h3Style"]/@href')
-
     async def process_mp(self, url, term):
-        return url, await self.c.get_html(f'{url}/lang/el'), term
+        # The HTML is parsed in `parse_item` so that the sources can be
+        # entered in the ledger
+        return url, await self.c.get_text(f'{url}/lang/el'), term
 
-    def parse_item(url, html, term):
-        name = clean_spaces(html.xpath('string(//h1)'))
+    def after(output):
+        ledger = SourceLedger(MpProfiles)
+        for item in ledger.select(MpProfiles.parse_item, output):
+            ledger.record(item[0], [MpProfiles.parse_item(*item)])
+        ledger.report()
+
+    def parse_item(url, text, term):
+        html = parse_html(f'{url}/lang/el', text)
+        name = clean_spaces(sel.HEADING_TEXT(html))
         name = MultilingualField(el=name,
                                  en=translit_elGrek2Latn(name),
                                  tr=translit_el2tr(name))
@@ -65,7 +64,7 @@ class MpProfiles(Task):
 
         birth_date, place_of_origin = extract_birth_details(url, html, 'el')
 
-        district, party = html.xpath('string(//div[@class = "articleBox"]/p[1])').splitlines()
+        district, party = sel.ARTICLE_LEAD_TEXT(html).splitlines()
         district = district.rpartition(' ')[-1]
 
         contact_details = [ContactDetails(type=t, value=clean_spaces(f(i), True))
@@ -98,14 +97,16 @@ class MpProfiles(Task):
                                              links=links)],
                 place_of_origin=MultilingualField(el=place_of_origin))
         mp.insert(merge=mp.exists)
+        return mp._id
 
 
 class ReconcileProfileNames(MpProfiles):
 
     def after(output):
         names_and_ids = {i['_id']: i['name']['el'] for i in MP.collection.find()}
-        names = tuple(clean_spaces(h.xpath('string(//h1)'))
-                      for _, h, _ in output)
+        names = tuple(clean_spaces(sel.HEADING_TEXT(
+                          parse_html(f'{u}/lang/el', t)))
+                      for u, t, _ in output)
         output = StringIO()
         csv_writer = csv.writer(output)
         csv_writer.writerow(('name', 'id'))
@@ -144,7 +145,7 @@ class ContactInfo(Task):
 
     async def __call__(self):
         url = 'http://www.parliament.cy/easyconsole.cfm/id/185'
-        return await self.c.get_html(url)
+        return await self.c.get_html(url, subtree=sel.ARTICLE)
 
     def after(output):
         for mp_name, _, voice, email in extract_contact_rows(output):
@@ -180,7 +181,7 @@ class ReconcileContactNames(ContactInfo):
 
 
 def extract_contact_rows(rows):
-    rows = rows.xpath('//div[@class = "articleBox"]/div[2]/table[1]//tr')
+    rows = sel.ARTICLE_TABLE_ROWS(rows)
     rows = (tuple(clean_spaces(cell.text_content()) for cell in row)
             for row in rows)
     rows = (row[1:] for row in rows if row[0].isnumeric())
@@ -205,8 +206,8 @@ LABELS = {
 
 
 def extract_items(html, lang, *items):
-    return html.xpath(f'''//p[{' or '.join(f'contains(strong/text(), "{LABELS[lang][i]}")'
-                                           for i in items)}]/text()''')
+    return sel.labelled_para_text(len(items))(
+        html, **{f'label{n}': LABELS[lang][i] for n, i in enumerate(items)})
 
 
 def extract_birth_details(url, html, lang):
@@ -229,34 +230,31 @@ def extract_birth_details(url, html, lang):
 def extract_contact_details(url, html, lang):
     heading = {'el': 'Στοιχεία επικοινωνίας', 'en': 'Contact info'}[lang]
     try:
-        contact_details, = html.xpath(f'//p[contains(strong/text(), "{heading}")]'
-                                       '/following-sibling::p[1]')
+        contact_details, = sel.PARA_AFTER_LABEL(html, label=heading)
     except ValueError:
         logger.error(f"Could not extract contact details in '{url}/lang/{lang}'")
         return {}
     else:
+        values = ''.join(sel.STRING_VALUE(i) if hasattr(i, 'xpath') else i
+                         for i in sel.UNLABELLED_NODES(contact_details))
         contact_details = dict(zip(
             (clean_spaces(i.strip(': '), True)
-             for i in contact_details.xpath('./strong/text()')),
+             for i in sel.LABELS(contact_details)),
             filter(None,
                    (clean_spaces(i.strip(': '), True)
-                    for i in ''.join(i.xpath('string()') if hasattr(i, 'xpath') else i
-                                     for i in contact_details.xpath('./node()[not(self::strong)]')
-                                     ).splitlines()
-             ))))
+                    for i in values.splitlines()))))
         return contact_details
 
 
 def extract_images(html):
-    images = html.xpath('//a[@class = "lightview"]/@href | '
-                        '//a[contains(@href, "/assets/image/imageoriginal")]/@href')
+    images = sel.IMAGE_LINKS(html)
     images = sorted(set(images), key=images.index)
     return images
 
 
 def extract_homepage(url, html):
     try:
-        url, = html.xpath(f'//a[contains(string(.), "{url}")]/@href')
+        url, = sel.LINKS_LABELLED(html, label=url)
         url = url.rstrip('/') + '/'
         return url
     except ValueError:
@@ -12,12 +12,15 @@ import re
 
 import pandocfilters
 
-from ..client import Task
+from ..client import Crawler, SourceLedger, Task, parser_version
 from ..models import Bill, MP, PlenarySitting as PS
 from ..reconciliation import pair_name, load_pairings
-from ..text_utils import apply_subs, clean_spaces, parse_datetime, \
-                         pandoc_json_to, parse_long_date, \
+from .. import selectors as sel
+from ..text_utils import apply_subs, clean_spaces, iter_pandoc_blocks, \
+                         pandoc_block_to_text, parse_datetime, parse_html, \
+                         parse_long_date, resolve_link, \
                          TableParser, translit_unaccent_lc, ungarble_qh
+from .listings import crawl_paged_listing
 
 
 logger = logging.getLogger(__name__)
@@ -31,10 +34,12 @@ class PlenaryAgendas(Task):
 
     async def process_agenda_index(self):
         url = 'http://www.parliament.cy/easyconsole.cfm/id/290'
-        html = await self.c.get_html(url)
+        html = await self.c.get_html(url, links='lazy')
 
-        agenda_urls = await self.c.gather(self.process_multi_page_listing(href)
-                                          for href in html.xpath('//a[@class="h3Style"]/@href'))
+        agenda_urls = await self.c.gather(
+            self.process_multi_page_listing(
+                resolve_link(url, h, html.base_url))
+            for h in sel.H3_LINKS(html))
         agenda_urls = set(it.chain.from_iterable(agenda_urls))
         return await self.c.gather(self.process_agenda(href)
                                    for href in agenda_urls
@@ -45,31 +50,25 @@ class PlenaryAgendas(Task):
     async def process_multi_page_listing(self, url):
         if url.endswith('.pdf'):
             return [url]
-
-        html = await self.c.get_html(url)
-        pages = html.xpath('//a[contains(@class, "pagingStyle")]/@href')
-        if pages:
-            pages = {self.process_multi_page_page(url, form_data={'page': ''.join(filter(str.isdigit, p))})
-                     for p in pages}
-            return it.chain.from_iterable(await self.c.gather(pages))
-        else:
-            return await self.process_multi_page_page(url)
-
-    async def process_multi_page_page(self, url, form_data=None):
-        html = await self.c.get_html(url, form_data=form_data, request_method='post')
-        return html.xpath('//a[@class="h3Style"]/@href')
+        return await crawl_paged_listing(self.c, url)
 
     async def process_agenda(self, url):
         if url.endswith('.pdf'):
             _, payload = await self.c.get_payload(url, decode=True)
             return parse_pdf_agenda, (url, payload)
         else:
-            html = await self.c.get_html(url)
-            return parse_agenda, (url, html)
+            # The HTML is parsed in `parse_agenda` 'cause `lxml` trees can't
+            # be sent to worker processes
+            text = await self.c.get_text(url)
+            return parse_agenda, (url, text)
 
     def after(output):
-        for url, date, text, agenda_items in \
-                filter(None, (fn(url, c) for fn, (url, c) in output)):
+        ledger = SourceLedger(PlenaryAgendas)
+        parsed = it.chain.from_iterable(
+            Task.parse_all(fn, ledger.select(fn, (a for f, a in output
+                                                  if f is fn)))
+            for fn in (parse_agenda, parse_pdf_agenda))
+        for url, date, text, agenda_items in filter(None, parsed):
             plenary_sitting = PS(
                 _sources=[url],
                 agenda=PS.PlenaryAgenda(cap1=[i for i, _ in agenda_items.cap1],
@@ -79,17 +78,24 @@ class PlenaryAgendas(Task):
                 session=extract_session(url, text),
                 sitting=extract_sitting(url, text),
                 start_date=date)
-            try:
-                plenary_sitting.insert(merge=plenary_sitting.exists)
-            except plenary_sitting.InsertError as e:
-                logger.error(e)
-
-            for id_, title in agenda_items.bills_and_regs:
-                bill = Bill(_sources=[url], identifier=id_, title=title)
+            bills = [Bill(_sources=[url], identifier=id_, title=title)
+                     for id_, title in agenda_items.bills_and_regs]
+            # Sources are only entered in the ledger if all of their
+            # records were inserted, so that they're retried otherwise
+            complete = True
+            for record in (plenary_sitting, *bills):
                 try:
-                    bill.insert(merge=bill.exists)
-                except bill.InsertError as e:
+                    record.insert(merge=record.exists)
+                except record.InsertError as e:
                     logger.error(e)
+                    complete = False
+            if complete:
+                ledger.record(url, [plenary_sitting._id,
+                                    *(b._id for b in bills)])
+        ledger.report()
+
+
+_AgendaItems = namedtuple('_AgendaItems', 'cap1 cap4 bills_and_regs')
 
 
 class AgendaItems:
@@ -129,8 +135,6 @@ class AgendaItems:
         except StopIteration:
             return
 
-    _AgendaItems = namedtuple('AgendaItems', 'cap1 cap4 bills_and_regs')
-
     def __new__(cls, url, agenda_items_):
         agenda_items = cls._AgendaItemDict(tuple)
         for k, v in it.groupby(agenda_items_, key=cls._group):   # __init__ bypasses __setitem__ (maybe)
@@ -140,7 +144,7 @@ class AgendaItems:
                          f'{tuple(k for k, *_ in agenda_items[None])} '
                          f'in {url!r}')
 
-        return cls._AgendaItems(
+        return _AgendaItems(
             *map(lambda v: sorted(v, key=agenda_items_.index),
                  (agenda_items['13.06', '23.01', '23.02', '23.03', '23.10',
                                '23.15'],
@@ -222,18 +226,20 @@ def extract_sitting(url, text):
 RE_JUNK = re.compile(r'^ *([\.…]+)', re.MULTILINE)
 
 
-def parse_agenda(url, html):
-    text = clean_spaces(html.xpath('string(//div[@class="articleBox"])'))
+@parser_version(2)
+def parse_agenda(url, source):
+    html = parse_html(url, source)
+    text = clean_spaces(sel.ARTICLE_TEXT(html))
 
     agenda_items = (clean_spaces(RE_JUNK.sub('', agenda_item.text_content()),
                                  medial_newlines=True)
-                    for agenda_item in html.xpath('//div[@class="articleBox"]'
-                                                  '//tr'))
+                    for agenda_item in sel.ARTICLE_ROWS(html))
     agenda_items = filter(None, map(extract_id_and_title,
                                     it.repeat(url), agenda_items))
     agenda_items = AgendaItems(url, tuple(agenda_items))
     return (url,
-            parse_long_date(clean_spaces(html.xpath('string(//h1)')), plenary=True),
+            parse_long_date(clean_spaces(sel.HEADING_TEXT(html)),
+                            plenary=True),
             text,
             agenda_items)
 
@@ -261,6 +267,7 @@ def clean_title_text(text):
                      RE_JUNK.finditer(text), text)
 
 
+@parser_version(2)
 def parse_pdf_agenda(url, text):
     if (url == 'http://www.parliament.cy/images/media/redirectfile/'
                '13-0312015- agenda ΤΟΠΟΘΕΤΗΣΕΙΣ doc.pdf'):
@@ -275,7 +282,8 @@ def parse_pdf_agenda(url, text):
     # page
     pages = tuple(filter(None, pages.split('\x0c')))
 
-    rows_ = it.chain.from_iterable(TableParser(page).rows for page in pages)
+    rows_ = it.chain.from_iterable(TableParser(page).iter_rows()
+                                   for page in pages)
     # Group rows into tuples, using the leftmost cell as a key, which oughta
     # either contain a list number or be left blank
     agenda_items = (' '.join(i[-1] for i in v)
@@ -302,30 +310,42 @@ class PlenaryTranscripts(Task):
               ]
 
     async def __call__(self):
-        html = await self.c.get_html('http://www2.parliament.cy/parliamentgr/008_01.htm')
-
-        transcript_urls = await self.c.gather(self.process_transcript_listing(url)
-                                              for url in html.xpath('''\
-//a[starts-with(@href, "http://www2.parliament.cy/parliamentgr/008_01_01")]/@href'''))
+        # The index links to the listings, which link to the transcripts
+        crawl = Crawler(self.c, self.process_transcript_listing, max_depth=1)
+        transcript_urls = await crawl(
+            ['http://www2.parliament.cy/parliamentgr/008_01.htm'])
         return await self.c.gather(self.process_transcript(url)
-                                   for url in set(it.chain.from_iterable(transcript_urls))
+                                   for url in set(transcript_urls)
                                    if not any(i in url for i in self.ignore))
 
     async def process_transcript_listing(self, url):
-        html = await self.c.get_html(url)
-        return html.xpath('//a[contains(@href, "praktiko")]/@href')
+        html = await self.c.get_html(url, links='lazy')
+        links = [resolve_link(url, h, html.base_url) for h in sel.LINKS(html)]
+        return ([l for l in links if 'praktiko' in l],
+                [l for l in links if l.startswith(
+                    'http://www2.parliament.cy/parliamentgr/008_01_01')])
 
     async def process_transcript(self, url):
-        func, content = await self.c.get_payload(url, decode=True)
+        # Look at the heading before decoding the remainder of PDFs, which
+        # can run into the hundreds of pages
+        func, content = await self.c.get_payload(url, decode=True,
+                                                 pages=(1, 1))
+        if func == 'pdf_to_text' and not _has_bad_heading(content):
+            _, remainder = await self.c.get_payload(url, decode=True,
+                                                    pages=(2, None))
+            content += remainder
         return url, func, content
 
     def after(output):
-        for url, text, heading, date, cap2, bills in \
-                filter(None, (parse_transcript(*t) for t in output)):
+        ledger = SourceLedger(PlenaryTranscripts)
+        output = ledger.select(parse_transcript_attendance, output)
+        for url, heading, date, cap2, bills, attendees in \
+                filter(None, Task.parse_all(parse_transcript_attendance,
+                                            output)):
             attendees = filter(None,
                                ((PlenaryTranscripts.NAMES.get(v) or
                                  logger.debug(f'No match found for {v!r}'))
-                                for v in extract_attendees(url, text, heading, date)))
+                                for v in attendees))
             plenary_sitting = \
                 PS(_sources=[url],
                    agenda=PS.PlenaryAgenda(cap2=cap2),
@@ -337,6 +357,7 @@ class PlenaryTranscripts(Task):
                    start_date=date)
             plenary_sitting.insert(merge=plenary_sitting.exists)
 
+            record_ids, complete = [plenary_sitting._id], True
             for bill in bills:
                 try:
                     submit = Bill.Submission(plenary_sitting_id=plenary_sitting._id,
@@ -346,11 +367,17 @@ class PlenaryTranscripts(Task):
                 except ValueError:
                     # Discard likely malformed bills
                     logger.error(f'Unable to parse {bill!r} into a bill')
+                    complete = False
                     continue
 
                 bill = Bill(_sources=[url], actions=[submit],
                             identifier=bill.number, title=bill.title)
                 bill.insert(merge=bill.exists)
+                record_ids.append(bill._id)
+            # Sources with discarded bills are retried on the next run
+            if complete:
+                ledger.record(url, record_ids)
+        ledger.report()
 
 
 class ReconcileAttendanceNames(PlenaryTranscripts):
@@ -358,9 +385,9 @@ class ReconcileAttendanceNames(PlenaryTranscripts):
     def after(output):
         names_and_ids = {i['_id']: i['name']['el'] for i in MP.collection.find()}
         names = sorted(set(it.chain.from_iterable(
-            extract_attendees(u, t, h, d)
-            for u, t, h, d, *_ in
-            filter(None, (parse_transcript(*t) for t in output)))))
+            a for *_, a in
+            filter(None, Task.parse_all(parse_transcript_attendance,
+                                        output)))))
         output = StringIO()
         csv_writer = csv.writer(output)
         csv_writer.writerow(('name', 'id'))
@@ -410,17 +437,107 @@ ATTENDEE_SUBS = (('|', ' '),
                  ('ΠΙΝΑΚΑΣ ΠΕΡΙΕΧΟΜΕΝΩΝ', '🌯'),)
 
 
-def extract_attendees(url, text, heading, date):
+_ATTENDEES_START = tuple(k for k, v in ATTENDEE_SUBS if v == '🌮')
+_ATTENDEES_END = tuple(k for k, v in ATTENDEE_SUBS if v == '🌯')
+_CONTENTS = ('Περιεχόμενα', 'ΠΕΡΙΕΧΟΜΕΝΑ', 'ΠΙΝΑΚΑΣ ΠΕΡΙΕΧΟΜΕΝΩΝ')
+_RELIGIOUS_GROUPS = tuple(k for k in _ATTENDEES_END if k not in _CONTENTS)
+
+CAP2_HEADING = '(Η κατάθεση νομοσχεδίων και εγγράφων)'
+RE_CAP2_END = re.compile(r'ΠΡΟΕΔΡ(?:ΟΣ|ΕΥΩΝ|ΕΥΟΥΣΑ)')
+
+_TranscriptSections = namedtuple('_TranscriptSections',
+                                 'heading attendees religious_groups cap2')
+
+
+def _find_first(text, markers, start=0):
+    """The first of `markers` in `text` after `start` and its offset."""
+    return min(((i, m) for m in markers for i in (text.find(m, start),)
+                if i != -1),
+               default=(-1, None))
+
+
+def _find_last(text, markers):
+    """The last of `markers` in `text` and its offset."""
+    return max(((i, m) for m in markers for i in (text.rfind(m),)
+                if i != -1),
+               default=(-1, None))
+
+
+def index_transcript(text):
+    r"""Locate the sections of a transcript.
+
+    Return the heading, the attendee list, the list of representatives
+    of religious groups and the Chapter 2 table as slices of `text`.
+    `religious_groups` is `None` if the attendee list isn't followed by
+    it and `cap2` is `None` if the table's nowhere to be found.  Every
+    section is found with a handful of `str.find`s.
+
+    >>> text = (
+    ...     'ΠΡΑΚΤΙΚΑ ΤΗΣ ΒΟΥΛΗΣ\nΠΡΟΕΔΡΟΣ: Ομήρου\n'
+    ...     'Παρόντες|βουλευτές\nΑ  Β\n'
+    ...     'Παρόντες αντιπρόσωποι θρησκευτικών ομάδων\nΓ\n'
+    ...     'ΠΕΡΙΕΧΟΜΕΝΑ\n(Η κατάθεση νομοσχεδίων και εγγράφων)\nΔ\n'
+    ...     'ΠΡΟΕΔΡΕΥΩΝ: Ε')
+    >>> sections = index_transcript(text)
+    >>> text[sections.heading]
+    'ΠΡΑΚΤΙΚΑ ΤΗΣ ΒΟΥΛΗΣ\nΠΡΟΕΔΡΟΣ:'
+    >>> text[sections.attendees]
+    '\nΑ  Β\n'
+    >>> text[sections.religious_groups]
+    '\nΓ\n'
+    >>> text[sections.cap2]
+    '\nΔ\n'
+
+    Without any markers, the attendee list is all of the text:
+
+    >>> index_transcript('ΠΡΟΕΔΡΟΣ')
+    ... # doctest: +NORMALIZE_WHITESPACE
+    _TranscriptSections(heading=slice(0, 9, None),
+                        attendees=slice(0, None, None),
+                        religious_groups=None, cap2=None)
+    """
+    # The attendee markers are looked for with the pipes replaced, as in
+    # `extract_attendees`; the replacement doesn't shift any offsets
+    plain = text.replace('|', ' ') if '|' in text else text
+    start, marker = _find_last(plain, _ATTENDEES_START)
+    attendees_start = 0 if marker is None else start + len(marker)
+    end, marker = _find_first(plain, _ATTENDEES_END, attendees_start)
+    attendees_end = None if marker is None else end
+
+    religious_groups = None
+    if marker in _RELIGIOUS_GROUPS:
+        religious_groups_start = end + len(marker)
+        religious_groups_end, _ = _find_first(
+            plain, _CONTENTS + ('ΠΡΟΕΔΡ',), religious_groups_start)
+        religious_groups = slice(religious_groups_start,
+                                 None if religious_groups_end == -1 else
+                                 religious_groups_end)
+
+    cap2 = None
+    cap2_start = text.find(CAP2_HEADING)
+    if cap2_start != -1:
+        cap2_start += len(CAP2_HEADING)
+        cap2_end = RE_CAP2_END.search(text, cap2_start)
+        if cap2_end:
+            cap2 = slice(cap2_start, cap2_end.start())
+    return _TranscriptSections(slice(0, text.find('ΠΡΟΕΔΡ') + 9),
+                               slice(attendees_start, attendees_end),
+                               religious_groups, cap2)
+
+
+def extract_attendees(url, text, heading, date, sections=None):
+    sections = sections or index_transcript(text)
     # Split at page breaks 'cause the columns will have likely shifted
     # and strip off leading whitespace
-    *_, attendees = apply_subs(text, ATTENDEE_SUBS).rpartition('🌮')
+    attendees = apply_subs(text[sections.attendees], ATTENDEE_SUBS)
+    *_, attendees = attendees.rpartition('🌮')
     attendees, *_ = attendees.partition('🌯')
     attendees = ('\n'.join(l.lstrip() for l in s.splitlines())
                  for s in attendees.split('\x0c'))
     attendees = set(filter(lambda i: i and not i.isdigit(),
                            (clean_spaces(a, medial_newlines=True)
                             for t in attendees
-                            for a in TableParser(t).values)))
+                            for a in TableParser(t).iter_values())))
     if 'ΠΡΟΕΔΡΟΣ:' in heading:  # The President's not listed among the attendees
         attendees = attendees | {select_president(date)}
     return sorted(attendees)
@@ -436,7 +553,7 @@ def extract_sitting_from_tr(url, text):
     logger.warning(f'Unable to extract sitting number of {url!r}')
 
 
-_Cap2Item = namedtuple('Cap2Item', 'number title sponsors committees')
+_Cap2Item = namedtuple('_Cap2Item', 'number title sponsors committees')
 
 
 def extract_cap2_item(url, item):
@@ -457,10 +574,6 @@ def extract_cap2_item(url, item):
                      sponsors, committees)
 
 
-RE_CAP2 = re.compile(r'\(Η κατάθεση νομοσχεδίων και εγγράφων\)(.*?)'
-                     r'(?:ΠΡΟΕΔΡΟΣ|ΠΡΟΕΔΡΕΥΩΝ|ΠΡΟΕΔΡΕΥΟΥΣΑ)', re.DOTALL)
-
-
 def _item_groupper():
     counter, prev_length = 0, 0
 
@@ -484,16 +597,16 @@ def _item_groupper():
     return inner
 
 
-def extract_cap2(url, text):
-    try:
-        item_table = RE_CAP2.search(text).group(1)
-    except AttributeError:
+def extract_cap2(url, text, sections=None):
+    sections = sections or index_transcript(text)
+    if not sections.cap2:
         logger.debug(f'Unable to extract Chapter 2 table in {url!r}')
         return
 
-    item_table = RE_PAGE_NO.sub('', item_table).replace('|', ' ').split('\x0c')
+    item_table = RE_PAGE_NO.sub('', text[sections.cap2]).replace('|', ' ')
+    item_table = item_table.split('\x0c')
 
-    items = it.chain.from_iterable(TableParser(t, columns=4).rows
+    items = it.chain.from_iterable(TableParser(t, columns=4).iter_rows()
                                    for t in item_table)
     # ((<title>, <sponsor>, <committee>), ...)
     items = (tuple(clean_spaces(' '.join(x), medial_newlines=True)
@@ -517,6 +630,7 @@ RE_LIST_NUMBER = re.compile(r'\d{1,2}\.$')
 
 PANDOC_TRANSFORMS =  {
     'AlignDefault': lambda _: None,
+    'LineBreak': lambda _: ' ',
     'OrderedList': lambda _: [pandoc_ListNumberMarker],
     'Para': lambda v: _walk_pandoc_ast(v),
     'Period': lambda _: '.',
@@ -558,11 +672,22 @@ def extract_pandoc_items(url, list_):
                 yield from extract_pandoc_items(url, x)
 
 
-def extract_pandoc_cap2(url, content):
-    tables = filter(_locate_cap2_table, json.loads(content)['blocks'])
-    try:
-        table = next(tables)
-    except StopIteration:
+def read_pandoc_transcript(content):
+    """Render a pandoc transcript as text and pick out its Chapter 2 table.
+
+    The AST is decoded one block at a time and only the table is kept
+    around.
+    """
+    text, table = [], None
+    for block in iter_pandoc_blocks(content):
+        if table is None and _locate_cap2_table(block):
+            table = block
+        text.append(pandoc_block_to_text(block))
+    return '\n\n'.join(text), table
+
+
+def extract_pandoc_cap2(url, table):
+    if not table:
         logger.debug(f'Unable to extract Chapter 2 table in {url!r}')
         return
 
@@ -589,26 +714,55 @@ def extract_start_time(heading):
             dt.timedelta(hours=p_to_24(int(h), p), minutes=int(m))).isoformat()
 
 
+PANDOC_DECODERS = {'docx_to_json', 'docx_to_json_native'}
+
+
+def _has_bad_heading(text):
+    """Whether the heading on the first page of `text` can't be parsed."""
+    if 'ΠΡΟΕΔΡ' not in text:    # The heading runs onto the next page
+        return False
+    try:
+        extract_start_time(clean_spaces(text[index_transcript(text).heading],
+                                        medial_newlines=True))
+    except Exception:
+        return True
+    return False
+
+
 def parse_transcript(url, func, content):
-    if func == 'docx_to_json':
-        text = pandoc_json_to(content, 'plain')
+    if func in PANDOC_DECODERS:
+        text, cap2_table = read_pandoc_transcript(content)
     else:
         text = content
 
-    heading = clean_spaces(text[:(text.find('ΠΡΟΕΔΡ') + 9)],
-                           medial_newlines=True)
+    sections = index_transcript(text)
+    heading = clean_spaces(text[sections.heading], medial_newlines=True)
     try:
         date = extract_start_time(heading)
     except Exception as e:
         logger.error(f'{e}; skipping {url!r}')
         return
 
-    if func == 'docx_to_json':
-        cap2, bills_and_regs = (extract_pandoc_cap2(url, content) or
+    if func in PANDOC_DECODERS:
+        cap2, bills_and_regs = (extract_pandoc_cap2(url, cap2_table) or
                                 ((), ()))
     else:
-        cap2, bills_and_regs = extract_cap2(url, text) or ((), ())
-    return url, text, heading, date, cap2, bills_and_regs
+        cap2, bills_and_regs = extract_cap2(url, text, sections) or ((), ())
+    return url, text, heading, date, cap2, bills_and_regs, sections
+
+
+@parser_version(1)
+def parse_transcript_attendance(url, func, content):
+    """Parse a transcript and extract its attendees.
+
+    Only what's needed to create records is returned, to keep down the
+    cost of sending the result back from a worker process.
+    """
+    transcript = parse_transcript(url, func, content)
+    if transcript:
+        url, text, heading, date, cap2, bills_and_regs, sections = transcript
+        return (url, heading, date, cap2, bills_and_regs,
+                extract_attendees(url, text, heading, date, sections))
 
 
 class FirstReading(Task):
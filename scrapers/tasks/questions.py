@@ -4,13 +4,16 @@ from io import StringIO
 import itertools as it
 import logging
 import re
+from urllib.parse import urldefrag
 
 from lxml.html import HtmlElement
 
-from ..client import Task
+from ..client import Crawler, SourceLedger, Task, parser_version
 from ..models import MP, Question
 from ..reconciliation import pair_name, load_pairings
-from ..text_utils import clean_spaces, parse_long_date, ungarble_qh
+from .. import selectors as sel
+from ..text_utils import clean_spaces, parse_html, parse_long_date, \
+                         resolve_link, ungarble_qh
 
 
 logger = logging.getLogger(__name__)
@@ -23,41 +26,44 @@ class Questions(Task):
 
     async def process(self):
         url = 'http://www2.parliament.cy/parliamentgr/008_02.htm'
-        return it.chain.from_iterable(await self.process_question_index(url))
+        html = await self.c.get_html(url, links='lazy')
+        # Listings link to one another; each is only visited once
+        crawl = Crawler(self.c, self.process_question_listing,
+                        key=lambda url: urldefrag(url).url)
+        return await crawl(extract_listing_urls(url, html))
 
     __call__ = process
 
-    async def process_question_index(self, url):
-        html = await self.c.get_html(url)
-
-        question_listing_urls = \
-            html.xpath('//a[contains(@href, "chronological")]/@href')
-        return it.chain.from_iterable(await self.c.gather(
-            {self.process_question_listing(href)
-             for href in question_listing_urls}))
-
     async def process_question_listing(self, url):
-        html = await self.c.get_html(url, clean=True)
-        return (it.chain.from_iterable(await self.process_question_index(url)),
-                ((url, *question)
-                 for question in demarcate_questions(url, html)))
+        text = await self.c.get_text(url)
+        html = parse_html(url, text, links='lazy')
+        return ((url, text),), extract_listing_urls(url, html)
+
+    def after(output):
+        ledger = SourceLedger(Questions)
+        output = list(ledger.select(parse_question_listing, output))
+        for (url, _), questions in \
+                zip(output, Task.parse_all(parse_question_listing, output)):
+            ledger.record(url, [Questions.parse_item(*q) for q in questions])
+        ledger.report()
 
-    def parse_item(url, heading, body, footer, counter):
-        match = RE_HEADING.search(heading.text).groupdict()
+    def parse_item(url, heading, body, answer_links, counter):
+        match = RE_HEADING.search(heading).groupdict()
 
         question = Question(_position_on_page=counter,
                             _sources=[url],
-                            answers=extract_answers(url, match, footer),
+                            answers=extract_answers(url, match, answer_links),
                             by=extract_names(url, heading),
                             date=parse_long_date(match['date']),
-                            heading=heading.text.rstrip('.'),
+                            heading=heading.rstrip('.'),
                             identifier=match['id'],
-                            text='\n\n'.join(p.text for p in body).strip())
+                            text='\n\n'.join(body).strip())
         if question.exists:
             logger.debug(f'Merging question {question!r}')
             question.insert(merge=True)
         else:
             question.insert()
+        return question._id
 
 
 class ReconcileQuestionNames(Questions):
@@ -66,8 +72,9 @@ class ReconcileQuestionNames(Questions):
         names_and_ids = {mp['_id']: ' '.join(mp['name']['el'].split()[::-1])
                          for mp in MP.collection.find()}
         names = sorted(set(it.chain.from_iterable(
-            RE_NAMES.findall(RE_NAMES_PREPARE.sub('', h.text))
-            for _, h, *_ in output)))
+            RE_NAMES.findall(RE_NAMES_PREPARE.sub('', h))
+            for _, h, *_ in it.chain.from_iterable(
+                Task.parse_all(parse_question_listing, output)))))
         output = StringIO()
         csv_writer = csv.writer(output)
         csv_writer.writerow(('name', 'id'))
@@ -84,6 +91,12 @@ QUESTION_PREFIXES = ('Ερώτηση με αρ.',
                      'ρώτηση με αρ. 23.06.009.04.563')
 
 
+def extract_listing_urls(url, html):
+    return [l for l in (resolve_link(url, h, html.base_url)
+                        for h in sel.LINKS(html))
+            if 'chronological' in l]
+
+
 def demarcate_questions(url, html):
     """Pin down question boundaries."""
     heading = None  # <Element>
@@ -91,7 +104,7 @@ def demarcate_questions(url, html):
     footer = []
 
     counter = 0
-    for e in it.chain(html.xpath('//*[self::hr or self::p]'),
+    for e in it.chain(sel.QUESTION_BLOCKS(html),
                       (HtmlElement('Ερώτηση με αρ.'),)):
         e.text = clean_spaces(e.text_content())
         norm_text = ungarble_qh(e.text)
@@ -118,6 +131,17 @@ def demarcate_questions(url, html):
             body.append(e)
 
 
+@parser_version(1)
+def parse_question_listing(url, text):
+    """Demarcate the questions in a listing as plain (picklable) data."""
+    return [(url, heading.text, [e.text for e in body],
+             list(it.chain.from_iterable(sel.DESCENDANT_LINKS(e)
+                                         for e in footer)),
+             counter)
+            for heading, body, footer, counter in
+            demarcate_questions(url, parse_html(url, text, clean=True))]
+
+
 RE_HEADING = re.compile(r'Ε?ρώτηση με(?: αρ\.)? (?P<id>[\d\.]+)'
                         r'(?:,? ημερομηνίας| που .* (?:την|στις)) '
                         r'(?P<date>[\w ]+)')
@@ -139,9 +163,7 @@ RE_NAMES = re.compile(r'''({uc}{lc}+
                       re.VERBOSE)
 
 
-def extract_answers(url, match, footer):
-    answer_links = (e.xpath('.//a/@href') for e in footer)
-    answer_links = it.chain.from_iterable(filter(None, answer_links))
+def extract_answers(url, match, answer_links):
     answer_links = sorted(set(answer_links))
     if not answer_links:
         logger.debug(f'Unable to extract URL of answer to question with number'
@@ -151,5 +173,5 @@ def extract_answers(url, match, footer):
 
 def extract_names(url, heading):
     names = (Questions.NAMES.get(n) or logger.error(f'No match found for {n!r} in {url!r}')
-             for n in RE_NAMES.findall(RE_NAMES_PREPARE.sub('', heading.text)))
+             for n in RE_NAMES.findall(RE_NAMES_PREPARE.sub('', heading)))
     return [{'mp_id': n} for n in filter(None, names)]
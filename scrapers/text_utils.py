@@ -1,62 +1,640 @@
 
 """Various stand-alone utilities for manipulating text."""
 
-from collections import Counter
+from copy import deepcopy
 import datetime
 import functools as ft
+import http.client
+from io import BytesIO
 import itertools as it
+import json
+import logging
+import multiprocessing.util
+import os
 from pathlib import Path
 import re
+import socket
 import string
 import subprocess
 import tempfile
-from urllib.parse import urldefrag
+import threading
+import time
+from urllib.parse import urldefrag, urljoin
+import zipfile
 
-import icu
 import lxml.etree
 import lxml.html
 
+from . import config
+
+logger = logging.getLogger(__name__)
+
+def _lazy(build):
+    """Defer calling `build` until the function it returns is first needed.
+
+    This keeps expensive objects (ICU transliterators and the like) from
+    being constructed at import time.
+    """
+    fn = None
+
+    @ft.wraps(build)
+    def wrapper(*args, **kwargs):
+        nonlocal fn
+        if fn is None:
+            fn = build()
+        return fn(*args, **kwargs)
+    return wrapper
+
 
 def _text_from_sp(args, input_=None):
     return (subprocess.run(args, input=input_, stdout=subprocess.PIPE)
                       .stdout.decode())
 
 
+class _PandocServer:
+    """A long-lived `pandoc server` listening on a free local port."""
+
+    def __init__(self, start_timeout=10, timeout=config.PANDOC_TIMEOUT):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            _, port = sock.getsockname()
+        self._process = subprocess.Popen(
+            ('pandoc', 'server', f'--port={port}', f'--timeout={timeout}'),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        # Give the server the chance to time out and respond first
+        self._connection = http.client.HTTPConnection('127.0.0.1', port,
+                                                      timeout=timeout + 5)
+        deadline = time.monotonic() + start_timeout
+        while True:
+            try:
+                self._connection.connect()
+            except ConnectionRefusedError:
+                if self._process.poll() is not None or \
+                        time.monotonic() > deadline:
+                    self.close()
+                    raise OSError('Unable to start `pandoc server`') \
+                        from None
+                time.sleep(0.05)
+            else:
+                break
+
+    def convert(self, text, from_, to):
+        self._connection.request(
+            'POST', '/', json.dumps({'text': text, 'from': from_, 'to': to}),
+            {'Accept': 'application/json',
+             'Content-Type': 'application/json'})
+        response = self._connection.getresponse()
+        body = response.read()
+        if response.status != 200:
+            raise ValueError(f'`pandoc server` responded with'
+                             f' {response.status}: {body[:200]!r}')
+        output = json.loads(body)['output']
+        # The command-line tool always ends its output with a newline
+        return output if output.endswith('\n') else output + '\n'
+
+    def close(self):
+        self._connection.close()
+        self._process.terminate()
+        self._process.wait()
+
+
+class _PandocPool:
+    """A pool of `pandoc server`s, which are started as they're needed.
+
+    Should one fail to start, pandoc is run once per document instead.
+    Servers are shut down when the process exits, including pool workers,
+    which skip `atexit` handlers.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.available = size > 0
+        self.reset()
+
+    def _acquire(self):
+        with self._cond:
+            # Wait for a server to be returned or for one that's failed
+            # to make room for another
+            while not self._idle and \
+                    len(self._servers) + self._starting >= self.size:
+                self._cond.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._starting += 1
+        # Servers are started outside of the lock, which would otherwise
+        # keep other threads from returning theirs
+        try:
+            server = _PandocServer()
+        except OSError:
+            with self._cond:
+                self._starting -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._starting -= 1
+            self._servers.append(server)
+        return server
+
+    def _release(self, server):
+        with self._cond:
+            self._idle.append(server)
+            self._cond.notify()
+
+    def convert(self, text, from_, to):
+        try:
+            server = self._acquire()
+        except OSError as e:
+            logger.warning(f'{e}; falling back on `pandoc`')
+            self.available = False
+            raise
+        try:
+            output = server.convert(text, from_, to)
+        except (OSError, http.client.HTTPException):
+            # Only servers whose connection has broken down are replaced
+            with self._cond:
+                self._servers.remove(server)
+                self._cond.notify()
+            server.close()
+            raise OSError('`pandoc server` failed to convert document')
+        except ValueError as e:
+            self._release(server)
+            raise OSError(e)
+        self._release(server)
+        return output
+
+    def close(self):
+        with self._cond:
+            servers, self._servers, self._idle = self._servers, [], []
+            self._cond.notify_all()
+        for server in servers:
+            server.close()
+
+    def reset(self):
+        """Forget about the parent's servers in a forked process."""
+        self._servers, self._idle, self._starting = [], [], 0
+        self._cond = threading.Condition()
+
+    def register_finalizer(self):
+        # Finalizers are run on exit by the main process and by
+        # `multiprocessing`'s workers alike, but are dropped on forking
+        multiprocessing.util.Finalize(None, self.close, exitpriority=10)
+
+
+_PANDOC_POOL = _PandocPool(config.PANDOC_SERVERS)
+_PANDOC_POOL.register_finalizer()
+multiprocessing.util.register_after_fork(_PANDOC_POOL,
+                                         _PandocPool.register_finalizer)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_PANDOC_POOL.reset)
+
+
+def _pandoc(text, from_, to):
+    """Convert `text` from and to any formats accepted by pandoc.
+
+    Conversions are handed off to a pooled pandoc server, sparing
+    us pandoc's start-up cost, and fall back on a fresh pandoc process.
+    """
+    if _PANDOC_POOL.available:
+        try:
+            return _PANDOC_POOL.convert(text, from_, to)
+        except OSError:
+            pass
+    return _text_from_sp(('pandoc', '--from='+from_, '--to='+to),
+                         text.encode())
+
+
+def _text_from_file_sp(build_args, buffer):
+    # For programs that won't read binary input from `stdin`
+    with tempfile.NamedTemporaryFile() as file:
+        file.write(buffer)
+        file.flush()
+        return _text_from_sp(build_args(file.name))
+
+
+def doc_to_text_args():
+    """The command line of `doc_to_text`, which reads from `stdin`."""
+    return ('antiword', '-w 0', '-')
+
+
 def doc_to_text(buffer):
     """Convert a `.doc` from `buffer` to plain text."""
-    return _text_from_sp(('antiword', '-w 0', '-'), buffer)
+    return _text_from_sp(doc_to_text_args(), buffer)
+
+
+def docx_to_json_args(path):
+    """The command line of `docx_to_json`, which reads from `path`."""
+    return ('pandoc', '--from=docx', '--to=json', path)
 
 
 def docx_to_json(buffer):
     """Convert a `.docx` from `buffer` to a pandoc AST."""
-    with tempfile.NamedTemporaryFile() as file:   # Pandoc requires the input be a file when it's a binary
-        file.write(buffer)
-        return _text_from_sp(('pandoc', '--from=docx', '--to=json', file.name))
+    return _text_from_file_sp(docx_to_json_args, buffer)
+
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+def _docx_para(elem):
+    """Convert a `w:p` into pandoc inlines."""
+    def iter_text():
+        for e in elem.iter(_W+'t', _W+'tab', _W+'br', _W+'cr',
+                           _W+'noBreakHyphen'):
+            if e.tag == _W+'t':
+                yield e.text or ''
+            elif e.tag in {_W+'br', _W+'cr'}:
+                yield '\n'
+            elif e.tag == _W+'noBreakHyphen':
+                yield '-'
+            else:
+                yield ' '
+
+    inlines = []
+    for token in re.split(r'(\s+)', ''.join(iter_text()).strip()):
+        if not token:
+            continue
+        elif not token.isspace():
+            inlines.append({'t': 'Str', 'c': token})
+        else:
+            inlines.append({'t': 'LineBreak' if '\n' in token else 'Space'})
+    return inlines
+
+
+def _read_docx_blocks(file):
+    blocks = []
+    containers, tables, numbered = [blocks], [], None
+    for event, elem in lxml.etree.iterparse(file, events=('start', 'end'),
+                                            tag=(_W+'p', _W+'tbl', _W+'tr',
+                                                 _W+'tc')):
+        if event == 'start':
+            if elem.tag == _W+'tbl':
+                tables.append([])
+            elif elem.tag == _W+'tr':
+                tables[-1].append([])
+            elif elem.tag == _W+'tc':
+                containers.append([])
+            continue
+
+        if elem.tag == _W+'p':
+            inlines = _docx_para(elem)
+            if not inlines:
+                pass
+            elif elem.find(f'{_W}pPr/{_W}numPr') is None:
+                containers[-1].append({'t': 'Para', 'c': inlines})
+            # Consecutive numbered paragraphs are gathered into a single list
+            elif numbered is not None and containers[-1] and \
+                    containers[-1][-1] is numbered:
+                numbered['c'][1].append([{'t': 'Para', 'c': inlines}])
+            else:
+                numbered = {'t': 'OrderedList',
+                            'c': [[1, {'t': 'Decimal'}, {'t': 'Period'}],
+                                  [[{'t': 'Para', 'c': inlines}]]]}
+                containers[-1].append(numbered)
+        elif elem.tag == _W+'tc':
+            tables[-1][-1].append(containers.pop())
+        elif elem.tag == _W+'tbl':
+            rows = tables.pop()
+            width = max(map(len, rows), default=0)
+            containers[-1].append({'t': 'Table',
+                                   'c': [[], [{'t': 'AlignDefault'}]*width,
+                                         [0]*width, [[]]*width, rows]})
+        if elem.tag in {_W+'p', _W+'tbl'}:
+            # Free up whatever's been processed; we're only ever looking
+            # back at the paragraph or table that's just ended
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+    return blocks
+
+
+def docx_to_json_native(buffer):
+    """Convert a `.docx` from `buffer` to a pandoc AST without pandoc.
+
+    Only paragraphs, numbered lists and tables are extracted - the bare
+    minimum needed to parse transcripts.
+
+    >>> def para(text, numbered=False):
+    ...     return ('<w:p>' + '<w:pPr><w:numPr/></w:pPr>' * numbered +
+    ...             f'<w:r><w:t>{text}</w:t></w:r></w:p>')
+    >>> def cell(text):
+    ...     return f'<w:tc>{para(text)}</w:tc>'
+    >>> buffer = BytesIO()
+    >>> with zipfile.ZipFile(buffer, 'w') as docx:
+    ...     docx.writestr('word/document.xml', (
+    ...         f'<w:document xmlns:w="{_W[1:-1]}"><w:body>' +
+    ...         para('Νομοσχέδια') +
+    ...         para('Πρώτο', True) + para('Δεύτερο', True) +
+    ...         '<w:tbl><w:tr>' + cell('Lorem') + cell('ipsum') +
+    ...         '</w:tr><w:tr>' + cell('dolor sit') + cell('amet') +
+    ...         '</w:tr></w:tbl>' + para('') +
+    ...         '</w:body></w:document>'))
+    >>> blocks = json.loads(docx_to_json_native(buffer.getvalue()))['blocks']
+    >>> [b['t'] for b in blocks]
+    ['Para', 'OrderedList', 'Table']
+    >>> for block in blocks:
+    ...     print(pandoc_block_to_text(block))
+    Νομοσχέδια
+    1. Πρώτο
+    2. Δεύτερο
+    Lorem      ipsum
+    dolor sit  amet
+    """
+    with zipfile.ZipFile(BytesIO(buffer)) as docx, \
+            docx.open('word/document.xml') as file:
+        blocks = _read_docx_blocks(file)
+    return json.dumps({'blocks': blocks, 'pandoc-api-version': [1, 17],
+                       'meta': {}}, ensure_ascii=False)
 
 
 def pandoc_json_to(json, format_):
     """Convert from pandoc JSON to any other format accepted by pandoc."""
-    return _text_from_sp(('pandoc', '--from=json', '--to='+format_),
-                         json.encode())
+    return _pandoc(json, 'json', format_)
+
+
+_JSON_DECODER = json.JSONDecoder()
+_RE_JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def _iter_json_array(text, idx):
+    def skip(idx):
+        return _RE_JSON_WHITESPACE.match(text, idx).end()
+
+    idx = skip(idx + 1)     # [
+    while text[idx] != ']':
+        value, idx = _JSON_DECODER.raw_decode(text, idx)
+        yield value
+        idx = skip(idx)
+        if text[idx] == ',':
+            idx = skip(idx + 1)
+
+
+def iter_pandoc_blocks(json_):
+    """Lazily decode the top-level blocks of a pandoc AST, one at a time.
+
+    >>> tuple(iter_pandoc_blocks('''{"meta": {"blocks": []},
+    ...     "blocks": [{"t": "Para", "c": [{"t": "Str", "c": "Lorem"}]},
+    ...                {"t": "HorizontalRule"}],
+    ...     "pandoc-api-version": [1, 17]}'''))     # doctest: +NORMALIZE_WHITESPACE
+    ({'t': 'Para', 'c': [{'t': 'Str', 'c': 'Lorem'}]},
+     {'t': 'HorizontalRule'})
+    """
+    def skip(idx):
+        return _RE_JSON_WHITESPACE.match(json_, idx).end()
+
+    idx = skip(0)
+    if json_[idx] == '[':   # The pre-1.18 `[meta, blocks]` layout
+        _, idx = _JSON_DECODER.raw_decode(json_, skip(idx + 1))
+        yield from _iter_json_array(json_, skip(skip(idx) + 1))
+        return
+
+    idx = skip(idx + 1)     # {
+    while json_[idx] != '}':
+        key, idx = _JSON_DECODER.raw_decode(json_, idx)
+        idx = skip(skip(idx) + 1)   # :
+        if key == 'blocks':
+            yield from _iter_json_array(json_, idx)
+            return
+        _, idx = _JSON_DECODER.raw_decode(json_, idx)
+        idx = skip(idx)
+        if json_[idx] == ',':
+            idx = skip(idx + 1)
+
+
+def _pandoc_inlines_to_text(inlines):
+    return ''.join(map(_pandoc_inline_to_text, inlines))
+
+
+def _pandoc_inline_to_text(inline):
+    type_, value = inline['t'], inline.get('c')
+    if type_ in {'Str', 'Code', 'Math'}:
+        return value if type_ == 'Str' else value[-1]
+    elif type_ in {'Space', 'SoftBreak'}:
+        return ' '
+    elif type_ == 'LineBreak':
+        return '\n'
+    elif type_ == 'Quoted':
+        quotes = '“”' if value[0]['t'] == 'DoubleQuote' else '‘’'
+        return quotes[0] + _pandoc_inlines_to_text(value[1]) + quotes[1]
+    elif type_ in {'Emph', 'Strong', 'Strikeout', 'Superscript', 'Subscript',
+                   'SmallCaps', 'Underline'}:
+        return _pandoc_inlines_to_text(value)
+    elif type_ in {'Span', 'Cite'}:
+        return _pandoc_inlines_to_text(value[1])
+    elif type_ in {'Link', 'Image'}:
+        return _pandoc_inlines_to_text(value[-2])
+    return ''   # Notes and raw inlines
+
+
+def _pandoc_table_rows(table):
+    """The rows of a pandoc table as lists of cells, each a list of blocks.
+
+    Tables have had a head, one or more bodies and a foot, made up of rows
+    of cells with their own attributes, since pandoc 2.10; before, they
+    were a list of header cells and a list of rows.  Cells spanning more
+    than one row or column are not padded out.
+    """
+    if len(table) == 5:
+        _, _, _, headers, rows = table
+        return ([headers] if any(headers) else []) + rows
+
+    _, _, _, (_, head), bodies, (_, foot) = table
+    rows = it.chain(head,
+                    *(intermediate + body for _, _, intermediate, body
+                      in bodies),
+                    foot)
+    return [[blocks for *_, blocks in cells] for _, cells in rows]
+
+
+def _pandoc_table_to_text(table):
+    rows = [[pandoc_block_to_text(b).splitlines() for b in
+             ({'t': 'Div', 'c': [None, c]} for c in row)]
+            for row in _pandoc_table_rows(table)]
+    if not rows:
+        return ''
+    widths = [max((len(l) for c in col for l in c), default=0)
+              for col in it.zip_longest(*rows, fillvalue=())]
+    return '\n'.join(
+        '  '.join(l.ljust(w) for l, w in zip(line, widths)).rstrip()
+        for row in rows
+        for line in it.zip_longest(*row, fillvalue=''))
+
+
+def pandoc_block_to_text(block):
+    """Render a pandoc block as plain text.
+
+    This is a simplified take on pandoc's own plain-text writer: nothing
+    is wrapped and table cells are separated by (at least) two spaces.
+
+    >>> print(pandoc_block_to_text(
+    ...     {'t': 'Table', 'c': [[], [], [], [],
+    ...      [[[{'t': 'Plain', 'c': [{'t': 'Str', 'c': 'Lorem'}]}],
+    ...        [{'t': 'Plain', 'c': [{'t': 'Str', 'c': 'ipsum'}]}]],
+    ...       [[{'t': 'Plain', 'c': [{'t': 'Str', 'c': 'dolor'},
+    ...                              {'t': 'Space'},
+    ...                              {'t': 'Str', 'c': 'sit'}]}],
+    ...        [{'t': 'Plain', 'c': [{'t': 'Str', 'c': 'amet'}]}]]]]}))
+    Lorem      ipsum
+    dolor sit  amet
+
+    Tables in the layout of pandoc 2.10 and later are rendered the same:
+
+    >>> def cell(text):
+    ...     return [[], {'t': 'AlignDefault'}, 1, 1,
+    ...             [{'t': 'Plain', 'c': [{'t': 'Str', 'c': text}]}]]
+    >>> print(pandoc_block_to_text(
+    ...     {'t': 'Table', 'c': [['', [], []], [None, []], [],
+    ...      [['', [], []], [[['', [], []], [cell('Lorem'), cell('ipsum')]]]],
+    ...      [[['', [], []], 0, [],
+    ...        [[['', [], []], [cell('dolor'), cell('sit amet')]]]]],
+    ...      [['', [], []], []]]}))
+    Lorem  ipsum
+    dolor  sit amet
+    """
+    type_, value = block['t'], block.get('c')
+    if type_ in {'Plain', 'Para'}:
+        return _pandoc_inlines_to_text(value)
+    elif type_ == 'Header':
+        return _pandoc_inlines_to_text(value[2])
+    elif type_ == 'LineBlock':
+        return '\n'.join(map(_pandoc_inlines_to_text, value))
+    elif type_ == 'CodeBlock':
+        return value[1]
+    elif type_ in {'BlockQuote', 'Div'}:
+        blocks = value if type_ == 'BlockQuote' else value[1]
+        return '\n\n'.join(filter(None, map(pandoc_block_to_text, blocks)))
+    elif type_ in {'OrderedList', 'BulletList'}:
+        if type_ == 'OrderedList':
+            (start, *_), items = value
+            markers = (f'{i}.' for i in it.count(start))
+        else:
+            items, markers = value, it.repeat('-')
+        return '\n'.join(
+            f'{m} ' + pandoc_block_to_text({'t': 'Div', 'c': [None, i]})
+            for m, i in zip(markers, items))
+    elif type_ == 'DefinitionList':
+        return '\n\n'.join(
+            _pandoc_inlines_to_text(term) + '\n' +
+            '\n'.join(pandoc_block_to_text({'t': 'Div', 'c': [None, d]})
+                      for d in defs)
+            for term, defs in value)
+    elif type_ == 'Table':
+        return _pandoc_table_to_text(value)
+    elif type_ == 'HorizontalRule':
+        return '-' * 72
+    return ''   # Raw blocks and nulls
+
+
+def pdf_to_text_args(first_page=None, last_page=None):
+    """The command line of `pdf_to_text`, which reads from `stdin`.
+
+    >>> pdf_to_text_args(2)
+    ('pdftotext', '-layout', '-f', '2', '-', '-')
+    """
+    pages = it.chain(('-f', str(first_page)) if first_page else (),
+                     ('-l', str(last_page)) if last_page else ())
+    return ('pdftotext', '-layout', *pages, '-', '-')
+
+
+def pdf_to_text(buffer, first_page=None, last_page=None):
+    """Parse a bytes object into a PDF and into text.
+
+    Pages are numbered from one and the range is inclusive of
+    `last_page`.
+    """
+    return _text_from_sp(pdf_to_text_args(first_page, last_page), buffer)
+
+
+def pdf_page_count_args(path):
+    """The command line of `pdf_page_count`, which reads from `path`."""
+    return ('pdfinfo', path)
+
 
+def parse_pdf_page_count(output,
+                         _RE_PAGES=re.compile(r'^Pages:\s+(\d+)$', re.M)):
+    """Extract the page count from the output of `pdfinfo`.
+
+    >>> parse_pdf_page_count('Tagged:         no\\nPages:          12\\n')
+    12
+    """
+    match = _RE_PAGES.search(output)
+    if not match:
+        raise ValueError('Unable to count the pages of PDF')
+    return int(match.group(1))
+
+
+def pdf_page_count(buffer):
+    """Count the pages of a PDF without converting it."""
+    return parse_pdf_page_count(_text_from_file_sp(pdf_page_count_args,
+                                                   buffer))
 
-def pdf_to_text(buffer):
-    """Parse a bytes object into a PDF and into text."""
-    return _text_from_sp(('pdftotext', '-layout', '-', '-'), buffer)
 
+def resolve_link(url, href, base=None):
+    """Resolve a link found on `url` relative to `base`.
 
-def parse_html(url, text, clean=False):
-    """Parse HTML into an `lxml` tree."""
+    Links to `url` itself are blanked, to avoid endless loops.
+
+    >>> resolve_link('http://example.com/a/b', ' c ')
+    'http://example.com/a/c'
+    >>> resolve_link('http://example.com/a/b', 'c', 'http://example.com/d/')
+    'http://example.com/d/c'
+    >>> resolve_link('http://example.com/a/b', '#top')
+    ''
+    """
+    href = urljoin(base or url, href.strip())
+    return '' if urldefrag(href).url == url else href
+
+
+def parse_html(url, text, clean=False, subtree=None, links='eager'):
+    """Parse HTML into an `lxml` tree.
+
+    `subtree` is a selector (see `scrapers.selectors`); if given, only
+    the elements it matches are kept, under a new `<body>`.  With
+    `links='eager'` all links in the tree are resolved with
+    `resolve_link`.  With `links='lazy'` they're left as they are, and
+    should be resolved with `resolve_link` against the tree's `base_url`
+    when they're extracted.
+
+    >>> from scrapers.selectors import ARTICLE_ROWS, H3_LINKS
+    >>> text = ('<base href="/b/"><div class="articleBox"><table><tr>'
+    ...         '<td><a class="h3Style" href="c">1</a></td></tr></table></div>'
+    ...         '<a class="h3Style" href="d">2</a>')
+    >>> H3_LINKS(parse_html('http://example.com/a', text))
+    ['http://example.com/b/c', 'http://example.com/b/d']
+    >>> html = parse_html('http://example.com/a', text,
+    ...                   subtree=ARTICLE_ROWS, links='lazy')
+    >>> H3_LINKS(html), html.base_url
+    (['c'], 'http://example.com/b/')
+    """
     if clean:
-        text = _text_from_sp(('pandoc', '--from=html', '--to=html5'),
-                             text.encode())
+        text = _pandoc(text, 'html', 'html5')
     html = lxml.html.document_fromstring(text)
-    # Endless loops ahoy
-    html.rewrite_links(lambda s: '' if urldefrag(s).url == url else s,
-                       base_href=url)
+    if links == 'eager':
+        html.rewrite_links(ft.partial(resolve_link, url), base_href=url)
+    elif links == 'lazy':
+        base = html.find('.//base[@href]')
+        if base is not None:
+            base = urljoin(url, base.get('href').strip())
+    else:
+        raise ValueError(f'Unknown link-resolution mode {links!r}')
+
+    if subtree is not None:
+        elements = subtree(html)
+        html = lxml.html.document_fromstring('<html><body></body></html>')
+        html.body.extend(deepcopy(e) for e in elements
+                         if not any(a in elements for a in e.iterancestors()))
+    if links == 'lazy':
+        html.getroottree().docinfo.URL = base or url
     return html
 
 
+@ft.lru_cache(maxsize=None)
+def _whitespace():
+    r"""The code points matched by `\s`, which stop at U+3000."""
+    import numpy as np
+
+    return np.array([i for i in range(0x3001) if chr(i).isspace()],
+                    dtype=np.uint32)
+
+
 class TableParser:
     """A tool for sifting through plain-text tables."""
 
@@ -64,6 +642,7 @@ class TableParser:
         self._columns = columns
         self._confidence = confidence
         self._lines = self._split_lines(text)
+        self._col_modes = None
 
     @staticmethod
     def _split_lines(text):
@@ -94,35 +673,50 @@ class TableParser:
     def _calc_col_modes(self):
         r"""The most common column indices in the table.
 
+        Columns are located in a whitespace occupancy matrix of the
+        lines, which is equivalent to (but a lot faster than) tallying up
+        `_find_cols` line by line.
+
         >>> TableParser('''
         ... Lorem ipsum   dolor sit    amet
         ... consectetur   adipiscing   totes elit
         ... ''')._calc_col_modes()
         (14, 27)
         """
-        col_freq = ft.reduce(lambda c, v: c + Counter(self._find_cols(v)),
-                             self._lines, Counter())
-        if not col_freq:
+        if not self._lines:
+            return ()
+        import numpy as np
+
+        # NumPy pads the shorter lines with NULs, which count as letters -
+        # but a column can't begin past the end of a line anyway
+        codes = np.array(self._lines).view(np.uint32)\
+                                     .reshape(len(self._lines), -1)
+        space = np.isin(codes, _whitespace())
+        # A column begins where a run of two or more spaces comes to an end
+        edges = space[:, :-2] & space[:, 1:-1] & ~space[:, 2:]
+        col_freq = edges.sum(axis=0)
+        cols, = col_freq.nonzero()
+        if not cols.size:
             return ()
 
         if self._columns:
-            return tuple(sorted(i for i, _ in
-                                col_freq.most_common(self._columns-1)))
+            # Break ties the way `Counter.most_common` would - in the order
+            # the columns were first encountered
+            first_seen = edges[:, cols].argmax(axis=0)
+            order = np.lexsort((cols, first_seen, -col_freq[cols]))
+            cols = cols[order[:self._columns-1]]
         else:
-            (_, most_common), = col_freq.most_common(1)
-            return tuple(sorted(k for k, v in col_freq.items()
-                                if v/most_common >= self._confidence))
+            cols = cols[col_freq[cols]/col_freq.max() >= self._confidence]
+        return tuple(sorted((cols + 2).tolist()))
 
     @staticmethod
     def _adjust_col(line, col):
         """Shift the `col` to the left if it overlaps a letter."""
-        part = line[:col]
-        if part == line:   # If the trailing cell's empty, take a shortcut
+        if col >= len(line):   # If the trailing cell's empty, take a shortcut
             return col
 
-        new_col = next(i for i, c in reversed(tuple(enumerate(part)))
-                       if c in string.whitespace)
-        return new_col
+        return next(i for i in range(col-1, -1, -1)
+                    if line[i] in string.whitespace)
 
     @classmethod
     def _chop_line(cls, line, cols):
@@ -146,6 +740,30 @@ class TableParser:
         return tuple(map(lambda line, slice_: line[slice_].strip(),
                          it.repeat(line), cols))
 
+    @property
+    def col_modes(self):
+        """The column indices of the table, calculated on first access."""
+        if self._col_modes is None:
+            self._col_modes = self._calc_col_modes()
+        return self._col_modes
+
+    def iter_rows(self):
+        r"""Lazily produce the cols of every row, sans any blank rows.
+
+        >>> rows = TableParser('''
+        ... Lorem ipsum   dolor sit    amet
+        ... consectetur   adipiscing   totes elit
+        ... ''').iter_rows()
+        >>> next(rows)
+        ('Lorem ipsum', 'dolor sit', 'amet')
+        """
+        rows = map(self._chop_line, self._lines, it.repeat(self.col_modes))
+        return filter(any, rows)
+
+    def iter_values(self):
+        """Lazily parse all values linearly, sans any empty strings."""
+        return filter(None, it.chain.from_iterable(self.iter_rows()))
+
     @property
     def rows(self):
         r"""Produce a cols within a row matrix, sans any blank rows.
@@ -157,9 +775,7 @@ class TableParser:
         (('Lorem ipsum', 'dolor sit',  'amet'),
          ('consectetur', 'adipiscing', 'totes elit'))
         """
-        rows = map(self._chop_line,
-                   self._lines, it.repeat(self._calc_col_modes()))
-        return tuple(filter(any, rows))
+        return tuple(self.iter_rows())
 
     @property
     def values(self):
@@ -172,8 +788,7 @@ class TableParser:
         ('Lorem ipsum', 'dolor sit',  'amet',
          'consectetur', 'adipiscing', 'totes elit')
         """
-        values = it.chain.from_iterable(self.rows)
-        return tuple(filter(None, values))
+        return tuple(self.iter_values())
 
 
 class _Translit:
@@ -202,28 +817,40 @@ class _Translit:
        'Omíru Yiannákis'
     """
 
-    translit_slugify = icu.Transliterator.createFromRules(
-        'translit_slugify',
-        r'''(.*) > &[^[:alnum:][:whitespace:]-] any-remove(
-                &any-lower(
-                    &Latin-ASCII(
-                        &el-Latin($1))));
-            :: Null;    # Backtrack
-            [[:whitespace:]-]+ > \-;
-         ''').transliterate
-
-    translit_unaccent_lc = icu.Transliterator.createInstance(
-        'NFKD; [:nonspacing mark:] any-remove; any-lower').transliterate
-
-    translit_elGrek2Latn = icu.Transliterator.createInstance(
-        'Greek-Latin/UNGEGN; Latin-ASCII').transliterate
-
-    with (Path(__file__).parent/'data'/'translit_Greek-Turkish.xml').open('rb') \
-            as _file:
-        _xml = lxml.etree.fromstring(_file.read())
-    translit_el2tr = icu.Transliterator.createFromRules(
-        'translit_el2tr',
-        '\n'.join(e.text for e in _xml.xpath('//tRule'))).transliterate
+    @_lazy
+    def translit_slugify():
+        import icu
+        return icu.Transliterator.createFromRules(
+            'translit_slugify',
+            r'''(.*) > &[^[:alnum:][:whitespace:]-] any-remove(
+                    &any-lower(
+                        &Latin-ASCII(
+                            &el-Latin($1))));
+                :: Null;    # Backtrack
+                [[:whitespace:]-]+ > \-;
+             ''').transliterate
+
+    @_lazy
+    def translit_unaccent_lc():
+        import icu
+        return icu.Transliterator.createInstance(
+            'NFKD; [:nonspacing mark:] any-remove; any-lower').transliterate
+
+    @_lazy
+    def translit_elGrek2Latn():
+        import icu
+        return icu.Transliterator.createInstance(
+            'Greek-Latin/UNGEGN; Latin-ASCII').transliterate
+
+    @_lazy
+    def translit_el2tr():
+        import icu
+        with (Path(__file__).parent/'data'/'translit_Greek-Turkish.xml') \
+                .open('rb') as file:
+            xml = lxml.etree.fromstring(file.read())
+        return icu.Transliterator.createFromRules(
+            'translit_el2tr',
+            '\n'.join(e.text for e in xml.xpath('//tRule'))).transliterate
 
 translit_slugify = _Translit.translit_slugify
 translit_unaccent_lc = _Translit.translit_unaccent_lc
@@ -267,13 +894,17 @@ def parse_short_date(
             from None
 
 
-_EL_MONTHS = dict(zip(
-    map(translit_unaccent_lc, icu.DateFormatSymbols(icu.Locale('el')).getMonths()),
-    range(1, 13)))
+@ft.lru_cache(maxsize=None)
+def _el_months():
+    import icu
+    return dict(zip(
+        map(translit_unaccent_lc,
+            icu.DateFormatSymbols(icu.Locale('el')).getMonths()),
+        range(1, 13)))
+
 
 def parse_long_date(date_string, plenary=False,
-                    _RE_DATE=re.compile(r'(\d{1,2})(?:[αηή]ς?)? (\w+) (\d{4})'),
-                    _EL_MONTHS=_EL_MONTHS):
+                    _RE_DATE=re.compile(r'(\d{1,2})(?:[αηή]ς?)? (\w+) (\d{4})')):
     """Convert a 'long' date in Greek into an ISO date.
 
     >>> parse_long_date('3 Μαΐου 2014')
@@ -312,7 +943,7 @@ def parse_long_date(date_string, plenary=False,
             from None
     try:
         return '{}-{:02d}-{:02d}'.format(
-            *map(int, (y, _EL_MONTHS[translit_unaccent_lc(m)], d)))
+            *map(int, (y, _el_months()[translit_unaccent_lc(m)], d)))
     except KeyError:
         raise ValueError(f'Malformed month in date {date_string!r}') from None
 